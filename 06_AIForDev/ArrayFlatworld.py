@@ -0,0 +1,308 @@
+import numpy as np
+from Flatworld import *
+from FlatworldSpatial import *
+
+GRASS = 0
+BLUE = 1
+RED = 2
+PLAYER = 3
+
+SORTS = [Grass, Blue, Red, Player]
+SPEEDS = [0.0, 300.0, 200.0, 300.0]
+
+def kindOf(sort):
+    return SORTS.index(sort)
+
+def kindsOf(sort):
+    return [kind for kind in range(len(SORTS)) \
+                 if issubclass(SORTS[kind], sort)]
+
+class ArrayWorld:
+    def __init__(self, boardSize, capacity=1024, seed=None,
+                       headless=True):
+        self.width, self.height = boardSize
+        self.headless = headless
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.positions = np.zeros((capacity, 2))
+        self.speeds = np.zeros(capacity)
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.leaves = np.zeros(capacity, dtype=np.int16)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def compact(self):
+        live = self.liveRows( )
+        for name in ['positions', 'speeds', 'kinds',
+                           'leaves', 'alive']:
+            array = getattr(self, name)
+            array[:len(live)] = array[live]
+        self.alive[len(live):self.count] = False
+        self.count = len(live)
+
+    def reserve(self, extra):
+        capacity = len(self.alive)
+        if self.count + extra <= capacity:
+            return
+        # Dead rows are only dropped when we would otherwise grow, and
+        # live rows keep their order so row-number tie breaks still hold.
+        self.compact( )
+        if self.count + extra <= capacity:
+            return
+        while capacity < self.count + extra:
+            capacity *= 2
+        for name in ['positions', 'speeds', 'kinds',
+                           'leaves', 'alive']:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:],
+                                   dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, kind, positions):
+        n = len(positions)
+        self.reserve(n)
+        rows = np.arange(self.count, self.count + n)
+        self.positions[rows] = positions
+        self.speeds[rows] = SPEEDS[kind]
+        self.kinds[rows] = kind
+        self.leaves[rows] = 5 if kind == GRASS else 0
+        self.alive[rows] = True
+        self.count += n
+        return rows
+
+    def liveRows(self, kinds=None):
+        alive = self.alive[:self.count]
+        if kinds is not None:
+            alive = alive & np.isin(self.kinds[:self.count], kinds)
+        return np.flatnonzero(alive)
+
+    def randomDrop(self, n):
+        size = np.array([self.width, self.height], dtype=float)
+        placed = self.positions[self.liveRows( )]
+        start = len(placed)
+
+        while len(placed) - start < n:
+            remaining = n - (len(placed) - start)
+            points = self.rng.random((remaining, 2)) * size
+            clash = np.zeros(remaining, dtype=bool)
+
+            index = CellIndex(placed, np.arange(len(placed)),
+                                      COLLISION_RADIUS)
+            queries, rows = index.within(points, COLLISION_RADIUS)
+            clash[queries] = True
+
+            index = CellIndex(points, np.arange(remaining),
+                                      COLLISION_RADIUS)
+            queries, rows = index.within(points, COLLISION_RADIUS)
+            clash[queries[rows < queries]] = True
+
+            placed = np.concatenate([placed, points[~clash]])
+        return placed[start:]
+
+    def spawn(self, sort, n):
+        return self.add(kindOf(sort), self.randomDrop(n))
+
+    def doSpawns(self, spawns):
+        for sort in spawns:
+            self.spawn(sort, spawns[sort])
+
+    def population(self, sort):
+        return len(self.liveRows(kindsOf(sort)))
+
+    def view(self, row):
+        return VIEWS[self.kinds[row]](self, row)
+
+    def views(self):
+        return [self.view(row) for row in self.liveRows( )]
+
+    def moveDirections(self, rows):
+        kinds = self.kinds[rows]
+        directions = np.zeros((len(rows), 2))
+
+        hunters = np.flatnonzero(kinds == RED)
+        prey = self.liveRows(kindsOf(Blue))
+        if len(hunters) > 0 and len(prey) > 0:
+            index = CellIndex(self.positions, prey, PREY_CELL_SIZE)
+            origins = self.positions[rows[hunters]]
+            targets = index.nearest(origins, 2000.0)
+            found = targets >= 0
+            directions[hunters[found]] = \
+                    self.positions[targets[found]] - origins[found]
+
+        if not self.headless:
+            for player in np.flatnonzero(kinds == PLAYER):
+                directions[player] = \
+                        tuple(self.view(rows[player]).moveDirection( ))
+        return directions
+
+    def tick(self, secondsSinceLastFrame):
+        rows = self.liveRows([BLUE, RED, PLAYER])
+        kinds = self.kinds[rows]
+        blueLike = (kinds == BLUE) | (kinds == PLAYER)
+        self.speeds[rows[blueLike]] *= 0.9999
+
+        vectors = self.moveDirections(rows)
+        length = np.sqrt(vectors[:, 0] * vectors[:, 0] +
+                                 vectors[:, 1] * vectors[:, 1])
+        moving = length != 0
+        vectors[moving] *= (self.speeds[rows[moving]] *
+                                    secondsSinceLastFrame /
+                                    length[moving])[:, None]
+
+        newPositions = np.maximum(self.positions[rows] + vectors, 0)
+        newPositions[newPositions[:, 0] >= self.width, 0] = \
+                                                           self.width - 1
+        newPositions[newPositions[:, 1] >= self.height, 1] = \
+                                                           self.height - 1
+
+        # Collisions are checked against where everyone stood at the
+        # start of the tick, so all creatures move in one step.
+        index = CellIndex(self.positions, self.liveRows( ),
+                                  COLLISION_RADIUS)
+        queries, others = index.within(newPositions,
+                                                  COLLISION_RADIUS,
+                                                  exclude=rows)
+        blocker = np.full(len(rows), -1)
+        if len(queries) > 0:
+            queries, _, others = firstPerQuery(
+                    queries, np.zeros(len(queries)), others)
+            blocker[queries] = others
+
+        free = blocker < 0
+        self.positions[rows[free]] = newPositions[free]
+        self.hit(rows[~free], blocker[~free])
+
+    def hit(self, hitters, blockers):
+        hitterKinds = self.kinds[hitters]
+        blockerKinds = self.kinds[blockers]
+        blueLike = (hitterKinds == BLUE) | (hitterKinds == PLAYER)
+
+        bites = blueLike & (blockerKinds == GRASS)
+        biters = hitters[bites]
+        grass = blockers[bites]
+        if len(grass) > 0:
+            order = np.lexsort((biters, grass))
+            biters = biters[order]
+            grass = grass[order]
+            position = np.arange(len(grass))
+            start = np.ones(len(grass), dtype=bool)
+            start[1:] = grass[1:] != grass[:-1]
+            rank = position - np.maximum.accumulate(
+                                          np.where(start, position, 0))
+            fed = rank < self.leaves[grass]
+            self.speeds[biters[fed]] += 1
+            np.subtract.at(self.leaves, grass[fed], 1)
+            eaten = grass[self.leaves[grass] <= 0]
+            self.alive[eaten] = False
+
+        kills = (hitterKinds == RED) & \
+                   ((blockerKinds == BLUE) | (blockerKinds == PLAYER))
+        self.alive[blockers[kills]] = False
+
+class OrganismRow:
+    def __init__(self, world, row):
+        self.world = world
+        self.row = row
+
+    @property
+    def position(self):
+        return pygame.Vector2(*self.world.positions[self.row])
+
+    @position.setter
+    def position(self, position):
+        self.world.positions[self.row] = (position.x, position.y)
+
+    @property
+    def alive(self):
+        return bool(self.world.alive[self.row])
+
+class CreatureRow(OrganismRow):
+    @property
+    def speed(self):
+        return float(self.world.speeds[self.row])
+
+    @speed.setter
+    def speed(self, speed):
+        self.world.speeds[self.row] = speed
+
+class GrassRow(OrganismRow, Grass):
+    @property
+    def leaves(self):
+        return int(self.world.leaves[self.row])
+
+    @leaves.setter
+    def leaves(self, leaves):
+        self.world.leaves[self.row] = leaves
+
+class BlueRow(CreatureRow, Blue):
+    color = 'blue'
+
+class RedRow(CreatureRow, Red):
+    color = 'red'
+
+class PlayerRow(CreatureRow, Player):
+    color = 'blue'
+
+VIEWS = [GrassRow, BlueRow, RedRow, PlayerRow]
+
+def arrayMainLoop(initialSpawns, spawnInterval,
+                          periodicSpawns, boardSize, playerType,
+                          headless=False, timestep=1/60.0,
+                          seed=None, maxTicks=None):
+    global world
+
+    world = ArrayWorld(boardSize, seed=seed, headless=headless)
+    if not headless:
+        setField(pygame.display.set_mode(boardSize))
+        clock = pygame.time.Clock( )
+    running = True
+    world.doSpawns(initialSpawns)
+    playerKinds = kindsOf(playerType)
+    tickCounter = 0
+
+    while len(world.liveRows(playerKinds)) > 0 and running:
+        tickCounter += 1
+        if headless:
+            secondsSinceLastFrame = timestep
+        else:
+            secondsSinceLastFrame = clock.tick(60) / 1000
+
+            for event in pygame.event.get( ):
+                if event.type == pygame.QUIT:
+                    running = False
+
+        world.tick(secondsSinceLastFrame)
+
+        if tickCounter % spawnInterval == 0:
+            world.doSpawns(periodicSpawns)
+
+        if not headless:
+            getField( ).fill('white')
+            for organism in world.views( ):
+                organism.draw(organism.position)
+            pygame.display.flip( )
+
+        if maxTicks != None and tickCounter >= maxTicks:
+            running = False
+
+    return tickCounter
+
+def getWorld( ):     return world
+
+if __name__ == '__main__':
+    pygame.init( )
+    ticks = arrayMainLoop(initialSpawns = {Red: 4,
+                                                         Player: 1,
+                                                         Grass : 20},
+                                   spawnInterval=30,
+                                   periodicSpawns={Grass: 1},
+                                   boardSize=(750,500), playerType=Blue)
+
+    print('That game lasted', ticks, 'ticks')
+    pygame.quit( )
@@ -2,36 +2,81 @@ import random
 import pygame
 from math import *
 
+COLLISION_RADIUS = 20
+PREY_CELL_SIZE = 100
+
+headlessMode = False
+rng = random.Random( )
+
+class NullProfiler:
+    def lap(self, phase):
+        pass
+
+    def endTick(self):
+        pass
+
+    def drawOverlay(self, field):
+        pass
+
+profiler = NullProfiler( )
+
 def mainLoop(initialSpawns, spawnInterval, 
-                     periodicSpawns, boardSize, playerType):
-    global organisms, field
+                     periodicSpawns, boardSize, playerType,
+                     headless=False, timestep=1/60.0,
+                     seed=None, maxTicks=None, observer=None):
+    global organisms, field, headlessMode, rng
     
-    field = pygame.display.set_mode(boardSize)
-    clock = pygame.time.Clock( )
+    if seed != None:
+        rng = random.Random(seed)
+
+    headlessMode = headless
+    if headless:
+        field = HeadlessField(boardSize)
+    else:
+        field = pygame.display.set_mode(boardSize)
+        clock = pygame.time.Clock( )
     running = True
-    organisms = [ ]
+    organisms = OrganismRegistry( )
     doSpawns(initialSpawns)
     tickCounter = 0
+    profiler.lap('setup')
 
-    while any([isinstance(organism, playerType) \
-                       for organism in organisms]) \
-            and running:
+    while organisms.population(playerType) > 0 and running:
         tickCounter += 1
-        secondsSinceLastFrame  = clock.tick(60) / 1000
+        if headless:
+            secondsSinceLastFrame = timestep
+        else:
+            secondsSinceLastFrame  = clock.tick(60) / 1000
         
-        for event in pygame.event.get( ):
-            if event.type == pygame.QUIT:
-                running = False
+            for event in pygame.event.get( ):
+                if event.type == pygame.QUIT:
+                    running = False
 
-        field.fill('white')
+            field.fill('white')
+        profiler.lap('events')
 
         for organism in organisms:
             organism.tick(secondsSinceLastFrame)
+        profiler.lap('organisms')
 
         if tickCounter % spawnInterval == 0:
             doSpawns(periodicSpawns)
+        profiler.lap('spawns')
+
+        organisms.endTick( )
+
+        if observer != None:
+            observer(tickCounter, organisms)
+        profiler.lap('bookkeeping')
+
+        if not headless:
+            profiler.drawOverlay(field)
+            pygame.display.flip( )
+            profiler.lap('display')
+        profiler.endTick( )
 
-        pygame.display.flip( )
+        if maxTicks != None and tickCounter >= maxTicks:
+            running = False
     
     return tickCounter
 
@@ -46,27 +91,197 @@ def randomDrop():
     w = field.get_width( )
     h = field.get_height( )
     while True:
-        position = pygame.Vector2(random.random( ) * w,
-                                            random.random( ) * h)
+        position = pygame.Vector2(rng.random( ) * w,
+                                            rng.random( ) * h)
         organism = anyCollision(position)
         if organism == None:
             return position
 
 def anyCollision(position, ignore = None ,
                         ignoreType = type(None)):
-    for organism in organisms:
+    found = None
+    for organism in organisms.near(position):
         if organism != ignore and \
                     not isinstance(organism, ignoreType):
-            if (organism.position - position).length() < 20:
-                return organism
-    return None
+            if (organism.position - position).length() < \
+                                                 COLLISION_RADIUS:
+                if found == None or \
+                        organism.organismId < found.organismId:
+                    found = organism
+    return found
+
+class SpatialGrid:
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+        self.cells = { }
+        self.cellOf = { }
+
+    def cellFor(self, position):
+        return (int(position.x // self.cellSize),
+                   int(position.y // self.cellSize))
+
+    def insert(self, organism):
+        cell = self.cellFor(organism.position)
+        self.cellOf[organism] = cell
+        self.cells.setdefault(cell, [ ]).append(organism)
+
+    def remove(self, organism):
+        cell = self.cellOf.pop(organism, None)
+        if cell != None:
+            members = self.cells[cell]
+            members.remove(organism)
+            if len(members) == 0:
+                del self.cells[cell]
+
+    def move(self, organism, position):
+        if organism not in self.cellOf:
+            return
+        cell = self.cellFor(position)
+        if cell != self.cellOf[organism]:
+            self.remove(organism)
+            self.cellOf[organism] = cell
+            self.cells.setdefault(cell, [ ]).append(organism)
+
+    def near(self, position):
+        cx, cy = self.cellFor(position)
+        for x in range(cx - 1, cx + 2):
+            for y in range(cy - 1, cy + 2):
+                members = self.cells.get((x, y))
+                if members:
+                    yield from members
+
+    def ring(self, cx, cy, radius):
+        if radius == 0:
+            yield (cx, cy)
+            return
+        for x in range(cx - radius, cx + radius + 1):
+            yield (x, cy - radius)
+            yield (x, cy + radius)
+        for y in range(cy - radius + 1, cy + radius):
+            yield (cx - radius, y)
+            yield (cx + radius, y)
+
+    def nearest(self, position, maxDistance):
+        best = None
+        bestDistance = maxDistance
+        cx, cy = self.cellFor(position)
+
+        for radius in range(int(maxDistance // self.cellSize) + 2):
+            for cell in self.ring(cx, cy, radius):
+                for organism in self.cells.get(cell, ( )):
+                    distance = (organism.position - position).length( )
+                    if distance < bestDistance or \
+                            (distance == bestDistance and best != None and
+                             organism.organismId < best.organismId):
+                        best = organism
+                        bestDistance = distance
+
+            if bestDistance <= radius * self.cellSize:
+                break
+        return best
+
+class OrganismRegistry:
+    def __init__(self, members=( )):
+        self.slots = [ ]
+        self.slotOf = { }
+        self.grid = SpatialGrid(COLLISION_RADIUS)
+        self.kindGrids = { }
+        self.counts = { }
+        self.nextId = 0
+        self.tickCount = 0
+        self.extend(members)
+
+    def __iter__(self):
+        slot = 0
+        while slot < len(self.slots):
+            organism = self.slots[slot]
+            if organism != None:
+                yield organism
+            slot += 1
+
+    def __len__(self):
+        return len(self.slotOf)
+
+    def __contains__(self, organism):
+        return organism in self.slotOf
+
+    def append(self, organism):
+        organism.organismId = self.nextId
+        self.nextId += 1
+        self.slotOf[organism] = len(self.slots)
+        self.slots.append(organism)
+        sort = type(organism)
+        self.counts[sort] = self.counts.get(sort, 0) + 1
+        self.grid.insert(organism)
+        for kind, grid in self.kindGrids.items( ):
+            if isinstance(organism, kind):
+                grid.insert(organism)
+
+    def extend(self, members):
+        for organism in members:
+            self.append(organism)
+
+    def __iadd__(self, members):
+        self.extend(members)
+        return self
+
+    def remove(self, organism):
+        slot = self.slotOf.pop(organism)
+        self.slots[slot] = None
+        self.counts[type(organism)] -= 1
+        self.grid.remove(organism)
+        for grid in self.kindGrids.values( ):
+            grid.remove(organism)
+
+    def population(self, kind, exact=False):
+        if exact:
+            return self.counts.get(kind, 0)
+        return sum([self.counts[sort] for sort in self.counts \
+                           if issubclass(sort, kind)])
+
+    def endTick(self):
+        self.tickCount += 1
+        if len(self.slotOf) < len(self.slots):
+            self.slots = [organism for organism in self.slots \
+                                if organism != None]
+            for slot in range(len(self.slots)):
+                self.slotOf[self.slots[slot]] = slot
+
+    def near(self, position):
+        return self.grid.near(position)
+
+    def nearest(self, position, kind, maxDistance):
+        if kind not in self.kindGrids:
+            grid = SpatialGrid(PREY_CELL_SIZE)
+            for organism in self:
+                if isinstance(organism, kind):
+                    grid.insert(organism)
+            self.kindGrids[kind] = grid
+        return self.kindGrids[kind].nearest(position, maxDistance)
+
+    def relocate(self, organism, position):
+        self.grid.move(organism, position)
+        for grid in self.kindGrids.values( ):
+            grid.move(organism, position)
+        organism.position = position
+
+class HeadlessField:
+    def __init__(self, boardSize):
+        self.width, self.height = boardSize
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
 
 class Organism:
     def __init__(self, position):
         self.position = position
 
     def tick(self, secondsSinceLastFrame):
-        self.draw(self.position)
+        if not headlessMode:
+            self.draw(self.position)
 
     def getBitten(self):
         pass
@@ -92,7 +307,7 @@ class Organism:
         if organism != None:
             return organism
         else:   
-            self.position = newPosition
+            organisms.relocate(self, newPosition)
             return None
             
 class Creature(Organism):
@@ -166,8 +381,11 @@ class Blue(Creature):
 
 class Player(Blue):
     def moveDirection(self):
-        keys = pygame.key.get_pressed( )
         vector = pygame.Vector2( )
+        if headlessMode:
+            return vector
+
+        keys = pygame.key.get_pressed( )
         if keys[pygame.K_w]:
             vector.y = -1
         if keys[pygame.K_s]:
@@ -184,14 +402,8 @@ class Red(Creature):
         super().__init__(position, 200, 'red')
 
     def moveDirection(self):
-        nearestDist = 2000.0
-        nearestCreature = None
-        for organism in organisms:
-            if isinstance(organism, Blue):
-                r,angle = self.bearing(organism)
-                if r < nearestDist:
-                    nearestDist = r
-                    nearestCreature = organism
+        nearestCreature = organisms.nearest(self.position,
+                                                         Blue, 2000.0)
 
         if nearestCreature:
             return nearestCreature.position - self.position
@@ -206,9 +418,29 @@ def getHeight( ):     return field.get_height( )
 def getWidth( ):     return field.get_width( )
 def getOrganisms( ):     return organisms
 def getField( ):     return field
+def isHeadless( ):     return headlessMode
+def getRandom( ):     return rng
+def getProfiler( ):     return profiler
 def setOrganisms(o):
      global organisms
      organisms = o
 def setField(f):
      global field
-     field = f
\ No newline at end of file
+     field = f
+def setRandom(r):
+     global rng
+     rng = r
+def setProfiler(p):
+     global profiler
+     profiler = p
+def setHeadless(h):
+     global headlessMode
+     headlessMode = h
+
+def openHeadless(boardSize, sampling=False):
+    setHeadless(True)
+    if sampling:
+        setField(pygame.Surface(boardSize))
+    else:
+        setField(HeadlessField(boardSize))
+    return field
\ No newline at end of file
@@ -0,0 +1,44 @@
+import time
+from multiprocessing import Pool
+from Flatworld import *
+
+def runScenario(job):
+    index, scenario, seed = job
+    start = time.perf_counter( )
+    ticks = mainLoop(headless=True, seed=seed, **scenario)
+
+    survivors = { }
+    for sort, count in getOrganisms( ).counts.items( ):
+        survivors[sort.__name__] = count
+
+    return {'scenario': index,
+               'seed': seed,
+               'ticks': ticks,
+               'survivors': survivors,
+               'wallTime': time.perf_counter( ) - start}
+
+def runBatch(scenarios, seeds, processes=None):
+    jobs = [(index, scenarios[index], seed) \
+                 for index in range(len(scenarios)) for seed in seeds]
+
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(runScenario, jobs):
+            yield result
+
+if __name__ == '__main__':
+    scenarios = [{'initialSpawns': {Red: 4, Blue: 10, Grass: 60},
+                         'spawnInterval': interval,
+                         'periodicSpawns': {Grass: 4},
+                         'boardSize': (750, 500),
+                         'playerType': Blue,
+                         'maxTicks': 3000}
+                        for interval in [30, 60, 120, 240]]
+
+    start = time.perf_counter( )
+    for result in runBatch(scenarios, seeds=range(8)):
+        print('Scenario', result['scenario'],
+                'seed', result['seed'],
+                'lasted', result['ticks'], 'ticks',
+                'in {0:.2f}s'.format(result['wallTime']),
+                result['survivors'])
+    print('Batch took {0:.2f}s'.format(time.perf_counter( ) - start))
@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import queue
+import traceback
+import platform
+import resource
+import subprocess
+import multiprocessing
+from Flatworld import *
+
+VARIANTS = ['manual', 'fuzzy', 'subsumption', 'neural', 'insects']
+POPULATIONS = [10, 100, 1000, 10000]
+TICKS = 200
+BUDGET = 30.0
+REPORT_INTERVAL = 0.1
+POLL_INTERVAL = 0.5
+AREA_PER_ORGANISM = 5000
+
+class ProgressReporter(NullProfiler):
+    def __init__(self, messages):
+        self.messages = messages
+        self.start = time.perf_counter( )
+        self.lastReport = self.start
+        self.ticks = 0
+        self.organismTicks = 0
+
+    def lap(self, phase):
+        if phase == 'setup':
+            self.start = time.perf_counter( )
+            self.report(done=False)
+
+    def endTick(self):
+        self.ticks += 1
+        self.organismTicks += len(getOrganisms( ))
+        now = time.perf_counter( )
+        if now - self.lastReport >= REPORT_INTERVAL:
+            self.lastReport = now
+            self.report(done=False)
+
+    def report(self, done, error=None):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            peak *= 1024
+        self.messages.put({'ticks': self.ticks,
+                                     'organismTicks': self.organismTicks,
+                                     'seconds': time.perf_counter( ) - self.start,
+                                     'peakRss': peak,
+                                     'done': done,
+                                     'error': error})
+
+def boardFor(population):
+    width = int(sqrt(population * AREA_PER_ORGANISM * 1.5))
+    return (max(width, 200), max(int(width / 1.5), 200))
+
+def scaled(ratios, population):
+    total = sum(ratios.values( ))
+    return {sort: max(1, round(population * ratios[sort] / total)) \
+                 for sort in ratios}
+
+def runBoard(population, ticks, spawns, spawnInterval, periodic):
+    mainLoop(initialSpawns=scaled(spawns, population),
+                 spawnInterval=spawnInterval,
+                 periodicSpawns=scaled(periodic, population),
+                 boardSize=boardFor(population),
+                 playerType=Blue,
+                 headless=True, seed=1, maxTicks=ticks)
+
+def runManual(population, ticks):
+    runBoard(population, ticks,
+                  {Red: 4, Player: 1, Blue: 4, Grass: 20}, 30,
+                  {Grass: 1})
+
+def runFuzzy(population, ticks):
+    from FuzzyFlatworld import FuzzyLogicBot
+    runBoard(population, ticks,
+                  {Red: 4, FuzzyLogicBot: 10, Grass: 60}, 30,
+                  {Grass: 4})
+
+def runSubsumption(population, ticks):
+    from SubsumptionFlatworld import SubsumptionBot
+    runBoard(population, ticks,
+                  {Red: 4, SubsumptionBot: 10, Grass: 60}, 600,
+                  {Grass: 60})
+
+def openArena(population):
+    openHeadless(boardFor(population))
+    setRandom(random.Random(1))
+
+def runNeural(population, ticks):
+    import NeuralFlatworld
+    openArena(population + 60)
+    half = max(1, population // 2)
+    reds = [NeuralFlatworld.Chromosome( ) for i in range(half)]
+    blues = [NeuralFlatworld.Chromosome( ) for i in range(half)]
+    NeuralFlatworld.oneGeneration(None, reds, blues, ticks, 1)
+
+def runInsects(population, ticks):
+    import Insects
+    openArena(population + 30)
+    hives = max(1, population // 10)
+    Insects.OneRepeat(None,
+                             [Insects.Chromosome( ) for i in range(hives)], 1)
+
+RUNNERS = {'manual': runManual,
+                   'fuzzy': runFuzzy,
+                   'subsumption': runSubsumption,
+                   'neural': runNeural,
+                   'insects': runInsects}
+
+def benchmarkChild(variant, population, ticks, messages):
+    reporter = ProgressReporter(messages)
+    setProfiler(reporter)
+    try:
+        RUNNERS[variant](population, ticks)
+    except BaseException:
+        reporter.report(done=True, error=traceback.format_exc( ))
+    else:
+        reporter.report(done=True)
+
+def measure(variant, population, ticks=TICKS, budget=BUDGET):
+    context = multiprocessing.get_context('spawn')
+    messages = context.Queue( )
+    child = context.Process(target=benchmarkChild,
+                                     args=(variant, population, ticks, messages))
+    child.start( )
+
+    deadline = time.perf_counter( ) + budget
+    last = None
+    error = None
+    status = 'timeout'
+    while True:
+        remaining = deadline - time.perf_counter( )
+        if remaining <= 0:
+            break
+        try:
+            message = messages.get(timeout=min(remaining, POLL_INTERVAL))
+        except queue.Empty:
+            if child.exitcode != None:
+                status = 'error'
+                error = 'child exited with code {0}'.format(child.exitcode)
+                break
+            continue
+        if message['error'] != None:
+            status = 'error'
+            error = message['error']
+            break
+        last = message
+        if last['done']:
+            status = 'done'
+            break
+        if last['ticks'] >= ticks:
+            status = 'ticks'
+            break
+
+    child.terminate( )
+    child.join( )
+
+    result = {'variant': variant, 'population': population,
+                 'status': status, 'ticks': 0, 'seconds': 0.0,
+                 'ticksPerSecond': None, 'perOrganismMicroseconds': None,
+                 'meanOrganisms': None, 'peakRssMB': None, 'error': error}
+    if last != None:
+        result['ticks'] = last['ticks']
+        result['seconds'] = last['seconds']
+        result['peakRssMB'] = last['peakRss'] / 2**20
+        if last['ticks'] > 0 and last['seconds'] > 0:
+            perTick = last['seconds'] / last['ticks']
+            result['ticksPerSecond'] = 1 / perTick
+            result['meanOrganisms'] = last['organismTicks'] / last['ticks']
+            if last['organismTicks'] > 0:
+                result['perOrganismMicroseconds'] = \
+                        last['seconds'] * 1e6 / last['organismTicks']
+    return result
+
+def currentCommit( ):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                                    cwd=os.path.dirname(
+                                                            os.path.abspath(__file__)),
+                                                    stderr=subprocess.DEVNULL,
+                                                    text=True).strip( )
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def runSuite(variants=VARIANTS, populations=POPULATIONS,
+                 ticks=TICKS, budget=BUDGET):
+    results = [ ]
+    for variant in variants:
+        for population in populations:
+            result = measure(variant, population, ticks, budget)
+            results.append(result)
+            print('{0:>12} {1:>6} {2:>8} {3:>10} {4:>12} {5:>10}'.format(
+                          variant, population, result['status'],
+                          format(result['ticksPerSecond'] or 0, '.1f'),
+                          format(result['perOrganismMicroseconds'] or 0,
+                                     '.2f'),
+                          format(result['peakRssMB'] or 0, '.1f')))
+
+    return {'commit': currentCommit( ),
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version( ),
+               'machine': platform.machine( ),
+               'ticks': ticks,
+               'budget': budget,
+               'results': results}
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else 'benchmark.json'
+    variants = sys.argv[2:] or VARIANTS
+
+    print('{0:>12} {1:>6} {2:>8} {3:>10} {4:>12} {5:>10}'.format(
+                  'variant', 'pop', 'status', 'ticks/s',
+                  'us/organism', 'peak MB'))
+    report = runSuite(variants)
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to', output)
@@ -0,0 +1,54 @@
+import os
+import random
+import numpy as np
+from Flatworld import getRandom, setRandom
+
+CHECKPOINT_FLAGS = {'--checkpoint', '--resume'}
+
+def saveCheckpoint(path, generation, **populations):
+    version, internal, gauss = getRandom( ).getstate( )
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        np.savez(f, generation=generation,
+                     rngVersion=version,
+                     rngInternal=np.array(internal, dtype=np.int64),
+                     rngGauss=np.nan if gauss == None else gauss,
+                     **populations)
+        f.flush( )
+        os.fsync(f.fileno( ))
+    os.replace(temporary, path)
+
+def loadCheckpoint(path):
+    with np.load(path) as data:
+        state = {name: data[name] for name in data.files}
+
+    gauss = float(state.pop('rngGauss'))
+    rng = random.Random( )
+    rng.setstate((int(state.pop('rngVersion')),
+                      tuple(state.pop('rngInternal').tolist( )),
+                      None if np.isnan(gauss) else gauss))
+    setRandom(rng)
+
+    return int(state.pop('generation')), state
+
+def resumeOrStart(checkpoint, fresh, resume=False, lastGeneration=None):
+    if not resume or checkpoint == None:
+        return 1, fresh
+    if not os.path.exists(checkpoint):
+        print('No checkpoint at', checkpoint, 'so starting afresh')
+        return 1, fresh
+
+    generation, state = loadCheckpoint(checkpoint)
+    for name in fresh:
+        if np.shape(state[name]) != np.shape(fresh[name]):
+            raise ValueError('{0} holds {1} of shape {2} but this run '
+                                     'expects {3}'.format(checkpoint, name,
+                                                                 np.shape(state[name]),
+                                                                 np.shape(fresh[name])))
+
+    if lastGeneration != None and generation >= lastGeneration:
+        print(checkpoint, 'already finished generation', generation,
+                'so there is nothing left to run')
+    else:
+        print('Resuming from', checkpoint, 'after generation', generation)
+    return generation + 1, state
@@ -0,0 +1,183 @@
+import sys
+import csv
+import json
+import time
+from collections import deque
+import Flatworld
+from Flatworld import *
+
+INSTRUMENTED = ['tick', 'moveDirection', 'moveTo', 'hit', 'draw']
+
+def organismClasses(root=Organism):
+    found = [root]
+    for sub in root.__subclasses__( ):
+        for cls in organismClasses(sub):
+            if cls not in found:
+                found.append(cls)
+    return found
+
+class TickProfiler:
+    def __init__(self, window=60):
+        self.phaseTimes = { }
+        self.methodTimes = { }
+        self.methodCalls = { }
+        self.collisionQueries = 0
+        self.collisionTime = 0.0
+        self.ticks = 0
+        self.recent = deque(maxlen=window)
+        self.current = { }
+        self.last = None
+        self.depth = { }
+        self.patches = [ ]
+        self.font = None
+
+    def lap(self, phase):
+        now = time.perf_counter( )
+        if self.last != None:
+            self.current[phase] = self.current.get(phase, 0.0) + \
+                                               now - self.last
+        self.last = now
+
+    def endTick(self):
+        for phase in self.current:
+            self.phaseTimes[phase] = self.phaseTimes.get(phase, 0.0) + \
+                                                 self.current[phase]
+        self.recent.append(self.current)
+        self.current = { }
+        self.ticks += 1
+
+    def timed(self, name, method):
+        profiler = self
+
+        def wrapper(organism, *args, **kwargs):
+            key = (type(organism).__name__, name)
+            if profiler.depth.get(name, 0) > 0:
+                return method(organism, *args, **kwargs)
+
+            profiler.depth[name] = 1
+            start = time.perf_counter( )
+            try:
+                return method(organism, *args, **kwargs)
+            finally:
+                profiler.methodTimes[key] = \
+                        profiler.methodTimes.get(key, 0.0) + \
+                        time.perf_counter( ) - start
+                profiler.methodCalls[key] = \
+                        profiler.methodCalls.get(key, 0) + 1
+                profiler.depth[name] = 0
+        return wrapper
+
+    def countedCollision(self, anyCollision):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter( )
+            try:
+                return anyCollision(*args, **kwargs)
+            finally:
+                profiler.collisionQueries += 1
+                profiler.collisionTime += time.perf_counter( ) - start
+        return wrapper
+
+    def patch(self, owner, name, replacement):
+        self.patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def start(self):
+        for cls in organismClasses( ):
+            for name in INSTRUMENTED:
+                if name in cls.__dict__:
+                    self.patch(cls, name,
+                                  self.timed(name, cls.__dict__[name]))
+
+        original = Flatworld.anyCollision
+        counted = self.countedCollision(original)
+        for module in list(sys.modules.values( )):
+            if getattr(module, 'anyCollision', None) is original:
+                self.patch(module, 'anyCollision', counted)
+
+        self.last = time.perf_counter( )
+        setProfiler(self)
+        return self
+
+    def stop(self):
+        setProfiler(NullProfiler( ))
+        while self.patches:
+            owner, name, original = self.patches.pop( )
+            setattr(owner, name, original)
+        return self
+
+    def rollingMeans(self):
+        means = { }
+        for tick in self.recent:
+            for phase in tick:
+                means[phase] = means.get(phase, 0.0) + tick[phase]
+        for phase in means:
+            means[phase] /= len(self.recent)
+        return means
+
+    def drawOverlay(self, field):
+        if self.font == None:
+            self.font = pygame.font.SysFont('arial', 16)
+
+        y = field.get_height( ) - 20
+        means = self.rollingMeans( )
+        for phase in sorted(means, key=means.get):
+            text = '{0}: {1:.2f} ms'.format(phase, means[phase] * 1000)
+            surface = self.font.render(text, True, pygame.Color('gray30'))
+            field.blit(surface, surface.get_rect( ).move(10, y))
+            y -= 18
+
+    def summary(self):
+        ticks = max(1, self.ticks)
+        phases = { }
+        for phase in self.phaseTimes:
+            phases[phase] = {'seconds': self.phaseTimes[phase],
+                                    'perTick': self.phaseTimes[phase] / ticks}
+
+        methods = { }
+        for key in self.methodCalls:
+            methods['.'.join(key)] = {'calls': self.methodCalls[key],
+                                                'seconds': self.methodTimes[key]}
+
+        return {'ticks': self.ticks,
+                   'phases': phases,
+                   'methods': methods,
+                   'collisionQueries': self.collisionQueries,
+                   'collisionSeconds': self.collisionTime}
+
+    def writeJson(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary( ), f, indent=2)
+
+    def writeCsv(self, path):
+        summary = self.summary( )
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['section', 'name', 'calls', 'seconds'])
+            for phase, values in summary['phases'].items( ):
+                writer.writerow(['phase', phase, summary['ticks'],
+                                       values['seconds']])
+            for method, values in summary['methods'].items( ):
+                writer.writerow(['method', method, values['calls'],
+                                       values['seconds']])
+            writer.writerow(['collision', 'anyCollision',
+                                   summary['collisionQueries'],
+                                   summary['collisionSeconds']])
+
+if __name__ == '__main__':
+    from SubsumptionFlatworld import *
+
+    profiler = TickProfiler( ).start( )
+    ticks = mainLoop(initialSpawns = {Red: 4,
+                                                    SubsumptionBot: 10,
+                                                    Grass : 60},
+                            spawnInterval=600,
+                            periodicSpawns={Grass: 60},
+                            boardSize=(750,500),
+                            playerType=Blue,
+                            headless=True, seed=1, maxTicks=1000)
+    profiler.stop( )
+
+    print('That game lasted', ticks, 'ticks')
+    print(json.dumps(profiler.summary( ), indent=2))
@@ -0,0 +1,89 @@
+import sys
+import struct
+import hashlib
+from SubsumptionFlatworld import *
+
+SCENARIOS = {
+    'manual': {'initialSpawns': {Red: 4, Blue: 10, Grass: 60},
+                   'spawnInterval': 30,
+                   'periodicSpawns': {Grass: 4}},
+    'fuzzy': {'initialSpawns': {Red: 4, FuzzyLogicBot: 10, Grass: 60},
+                 'spawnInterval': 30,
+                 'periodicSpawns': {Grass: 4}},
+    'subsumption': {'initialSpawns': {Red: 4, SubsumptionBot: 10,
+                                                   Grass: 60},
+                            'spawnInterval': 600,
+                            'periodicSpawns': {Grass: 60}},
+}
+
+GOLDEN = {
+    'manual':
+        '1d941710bf4b86f3adb5f8955dfcbbc4d8e115d95800c1d1fe93cce073e1b7ad',
+    'fuzzy':
+        'b103370bfca111ff016adea7fdfd2b0b8d8a6f48c564834281cc3a0de0201d07',
+    'subsumption':
+        'ef5e69abbe21a261b06a264b82a4e1a191029c1c216abc2fe281f97c0a23718b',
+}
+
+def trajectoryHash(scenario, seed=1, ticks=300):
+    digest = hashlib.sha256( )
+
+    def record(tickCounter, organisms):
+        for organism in organisms:
+            digest.update(type(organism).__name__.encode( ))
+            digest.update(struct.pack('<qdd', organism.organismId,
+                                                     organism.position.x,
+                                                     organism.position.y))
+
+    mainLoop(boardSize=(750, 500), playerType=Blue,
+                 headless=True, seed=seed, maxTicks=ticks,
+                 observer=record, **scenario)
+    return digest.hexdigest( )
+
+def perceptionError(epsilon=1e-3, seed=1, ticks=300):
+    excess = [0.0]
+
+    def compare(tickCounter, organisms):
+        if tickCounter % 50 != 0:
+            return
+        setPerceptionEpsilon(0)
+        full = Snapshot(organisms)
+        setPerceptionEpsilon(epsilon)
+        near = Snapshot(organisms)
+        radius = perceptionRadius( )
+
+        for bot, (closeIn, dangerDistances, dangerBearings) in \
+                full.perceptions.items( ):
+            vectors = full.positions - (bot.position.x, bot.position.y)
+            omitted = (np.hypot(vectors[:, 0], vectors[:, 1]) >=
+                              radius).sum( )
+            bound = 1 - (1 - epsilon)**omitted
+            for d in range(4):
+                for kind in range(len(KINDS)):
+                    error = abs(closeIn[d][kind] -
+                                    near.perceptions[bot][0][d][kind])
+                    excess[0] = max(excess[0], error - bound)
+
+    mainLoop(boardSize=(750, 500), playerType=Blue,
+                 headless=True, seed=seed, maxTicks=ticks,
+                 observer=compare, **SCENARIOS['subsumption'])
+    setPerceptionEpsilon(0)
+    return excess[0]
+
+if __name__ == '__main__':
+    failures = 0
+    for name in SCENARIOS:
+        actual = trajectoryHash(SCENARIOS[name])
+        if actual == GOLDEN[name]:
+            print(name, 'ok')
+        else:
+            failures += 1
+            print(name, 'MISMATCH', actual)
+
+    excess = perceptionError( )
+    if excess <= 1e-12:
+        print('perception radius ok')
+    else:
+        failures += 1
+        print('perception radius EXCEEDS BOUND by', excess)
+    sys.exit(1 if failures else 0)
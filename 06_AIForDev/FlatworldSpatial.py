@@ -0,0 +1,97 @@
+import numpy as np
+
+CELL_OFFSET = 1 << 20
+CELL_STRIDE = 1 << 21
+
+NEIGHBOURS = [(dx, -1, 1) for dx in (-1, 0, 1)]
+
+def ringColumns(radius):
+    if radius == 0:
+        return [(0, 0, 0)]
+    columns = [(-radius, -radius, radius), (radius, -radius, radius)]
+    for dx in range(-radius + 1, radius):
+        columns.append((dx, -radius, -radius))
+        columns.append((dx, radius, radius))
+    return columns
+
+def cellKeys(cells):
+    return (cells[:, 0] + CELL_OFFSET) * CELL_STRIDE + \
+               (cells[:, 1] + CELL_OFFSET)
+
+def distances(a, b):
+    d = a - b
+    return np.sqrt(d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1])
+
+def firstPerQuery(queries, values, rows):
+    order = np.lexsort((rows, values, queries))
+    queries = queries[order]
+    first = np.ones(len(queries), dtype=bool)
+    first[1:] = queries[1:] != queries[:-1]
+    return queries[first], values[order][first], rows[order][first]
+
+class CellIndex:
+    def __init__(self, positions, rows, cellSize):
+        self.positions = positions
+        self.cellSize = cellSize
+        keys = cellKeys(np.floor(positions[rows] /
+                                              cellSize).astype(np.int64))
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.rows = rows[order]
+
+    def candidates(self, points, columns):
+        keys = cellKeys(np.floor(points / self.cellSize).astype(np.int64))
+        order = np.argsort(keys)
+        keys = keys[order]
+        queries = [ ]
+        found = [ ]
+        for dx, low, high in columns:
+            shift = dx * CELL_STRIDE
+            start = np.searchsorted(self.keys, keys + shift + low, 'left')
+            counts = np.searchsorted(self.keys, keys + shift + high,
+                                                 'right') - start
+            total = counts.sum( )
+            if total == 0:
+                continue
+            first = np.repeat(start - (np.cumsum(counts) - counts),
+                                     counts)
+            queries.append(np.repeat(order, counts))
+            found.append(self.rows[first + np.arange(total)])
+
+        if len(queries) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(queries), np.concatenate(found)
+
+    def within(self, points, radius, exclude=None):
+        queries, rows = self.candidates(points, NEIGHBOURS)
+        keep = distances(self.positions[rows], points[queries]) < radius
+        if exclude is not None:
+            keep &= rows != exclude[queries]
+        return queries[keep], rows[keep]
+
+    def nearest(self, points, maxDistance):
+        best = np.full(len(points), -1)
+        bestDistance = np.full(len(points), float(maxDistance))
+        pending = np.arange(len(points))
+
+        for radius in range(int(maxDistance // self.cellSize) + 2):
+            if len(pending) == 0:
+                break
+            queries, rows = self.candidates(points[pending],
+                                                          ringColumns(radius))
+            if len(queries) > 0:
+                d = distances(self.positions[rows],
+                                    points[pending][queries])
+                queries, d, rows = firstPerQuery(queries, d, rows)
+                queries = pending[queries]
+                better = (d < bestDistance[queries]) | \
+                             ((d == bestDistance[queries]) &
+                              (best[queries] >= 0) &
+                              (rows < best[queries]))
+                best[queries[better]] = rows[better]
+                bestDistance[queries[better]] = d[better]
+
+            pending = pending[bestDistance[pending] >
+                                       radius * self.cellSize]
+        return best
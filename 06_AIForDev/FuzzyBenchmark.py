@@ -0,0 +1,61 @@
+import timeit
+import random
+from FuzzyFlatworld import Fuzzy
+
+class LegacyFuzzy:
+    def __init__(self, value=0):
+        self.value = max(0, min(1, value))
+
+    def __and__(self, other):
+        return LegacyFuzzy(self.value * other.value)
+
+    def __invert__(self):
+        return LegacyFuzzy(1 - self.value)
+
+    def __or__(self, other):
+        return ~((~self) & (~other))
+
+    def __gt__(self, other):
+        return self.value > other.value
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+rng = random.Random(1)
+VALUES = [rng.random( ) / 100 for i in range(1000)]
+REPEATS = 200
+
+def foldOr(sort, values):
+    result = sort(0)
+    for value in values:
+        result |= value
+    return result
+
+def foldAnd(sort, values):
+    result = sort(1)
+    for value in values:
+        result &= value
+    return result
+
+def benchmark(name, statement):
+    seconds = min(timeit.repeat(statement, number=REPEATS, repeat=5))
+    print('{0:>24}: {1:8.2f} us'.format(name, seconds / REPEATS * 1e6))
+    return seconds
+
+if __name__ == '__main__':
+    legacy = [LegacyFuzzy(value) for value in VALUES]
+    compact = [Fuzzy(value) for value in VALUES]
+
+    assert abs(foldOr(LegacyFuzzy, legacy).value - \
+                 foldOr(Fuzzy, compact).value) < 1e-9
+    assert abs(foldOr(Fuzzy, compact).value - \
+                 Fuzzy.any(compact).value) < 1e-9
+
+    print('Folding', len(VALUES), 'values')
+    before = benchmark('legacy |=', lambda: foldOr(LegacyFuzzy, legacy))
+    after = benchmark('slots |=', lambda: foldOr(Fuzzy, compact))
+    batch = benchmark('Fuzzy.any', lambda: Fuzzy.any(compact))
+    benchmark('legacy &=', lambda: foldAnd(LegacyFuzzy, legacy))
+    benchmark('slots &=', lambda: foldAnd(Fuzzy, compact))
+    print('In-place OR is {0:.1f}x faster, Fuzzy.any {1:.1f}x'.format(
+              before / after, before / batch))
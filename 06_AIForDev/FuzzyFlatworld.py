@@ -1,4 +1,6 @@
+import numpy as np
 from Flatworld import *
+from FlatworldSpatial import CellIndex
 
 N = 0
 S = 1
@@ -6,9 +8,18 @@ E = 2
 W = 3
 
 class Fuzzy:
+    __slots__ = ('value',)
+
     def __init__(self, value=0):
         self.value = max(0, min(1, value))
 
+    @staticmethod
+    def any(values):
+        miss = 1
+        for fuzzy in values:
+            miss *= 1 - fuzzy.value
+        return Fuzzy(1 - miss)
+
     def __and__(self, other):
         return Fuzzy(self.value * other.value)
 
@@ -16,7 +27,15 @@ class Fuzzy:
         return Fuzzy(1 - self.value)
 
     def __or__(self, other):
-        return ~((~self) & (~other))
+        return Fuzzy(self.value + other.value - self.value * other.value)
+
+    def __iand__(self, other):
+        self.value *= other.value
+        return self
+
+    def __ior__(self, other):
+        self.value += other.value - self.value * other.value
+        return self
 
     def __gt__(self, other):
         return self.value > other.value
@@ -30,64 +49,177 @@ class Fuzzy:
     def __repr__(self):
         return str(self.value)
 
-class Spot:
-    def __init__(self, position, thing):
-        vector = thing.position - position
-        self.distance, self.bearing = vector.as_polar()
-
-        self.direction = set()
-
-        if self.bearing < 0:
-            self.direction.add(N)
-
-        if self.bearing > 0:
-            self.direction.add(S)
-
-        if abs(self.bearing) < 90:
-            self.direction.add(E)
-
-        if abs(self.bearing) > 90:
-            self.direction.add(W)
-
-        if isinstance(thing,Grass):
-            self.kind = 'food'
-            self.isClose = closeTo(self.distance)
-
-        elif isinstance(thing, Red):
-            self.kind = 'danger'
-            self.isClose = closeTo(self.distance)
-
-        elif isinstance(thing,Blue):
-            self.kind = 'friend'
-            self.isClose = closeTo(self.distance)
-
+KINDS = ['food', 'danger', 'friend']
+FOOD = 0
+DANGER = 1
+FRIEND = 2
+
+kindCodes = { }
+
+def kindOf(organism):
+    sort = type(organism)
+    if sort not in kindCodes:
+        if issubclass(sort, Grass):
+            kindCodes[sort] = FOOD
+        elif issubclass(sort, Red):
+            kindCodes[sort] = DANGER
+        elif issubclass(sort, Blue):
+            kindCodes[sort] = FRIEND
+        else:
+            print('Unknown thing:', organism)
+            kindCodes[sort] = -1
+    return kindCodes[sort]
+
+def perceive(origins, positions, kinds, selves=None):
+    vectors = positions[np.newaxis, :, :] - origins[:, np.newaxis, :]
+    distances = np.hypot(vectors[..., 0], vectors[..., 1])
+    bearings = np.degrees(np.arctan2(vectors[..., 1], vectors[..., 0]))
+    nearness = closeness(distances)
+
+    directions = np.stack([bearings < 0,
+                                    bearings > 0,
+                                    np.abs(bearings) < 90,
+                                    np.abs(bearings) > 90], axis=1)
+    sorts = np.stack([kinds == kind for kind in range(len(KINDS))])
+
+    seen = directions[:, :, np.newaxis, :] & \
+              sorts[np.newaxis, np.newaxis, :, :]
+    if selves is not None:
+        bots = np.flatnonzero(selves >= 0)
+        seen[bots, :, :, selves[bots]] = False
+    misses = np.where(seen, (1 - nearness)[:, np.newaxis, np.newaxis, :], 1)
+    closeIn = 1 - np.prod(misses, axis=-1)
+    return distances, bearings, closeIn
+
+PERCEPTION_BLOCK = 250000
+
+perceptionEpsilon = 0.0
+
+def perceptionRadius( ):
+    if perceptionEpsilon <= 0:
+        return inf
+    return 20 / sqrt(perceptionEpsilon)
+
+class Snapshot:
+    def __init__(self, organisms):
+        self.organisms = organisms
+        self.tickCount = organisms.tickCount
+        self.members = list(organisms)
+        self.positions = np.array([(organism.position.x,
+                                               organism.position.y) \
+                                              for organism in self.members],
+                                             dtype=float).reshape(-1, 2)
+        self.kinds = np.array([kindOf(organism) \
+                                         for organism in self.members], dtype=int)
+        self.dangers = np.flatnonzero(self.kinds == DANGER)
+        self.columnOf = {self.members[column]: column \
+                                  for column in range(len(self.members))}
+        self.index = None
+
+        self.perceptions = { }
+        self.perceiveAll([organism for organism in self.members \
+                                  if isinstance(organism, FuzzyLogicBot)])
+
+    def isCurrent(self, organisms):
+        return organisms is self.organisms and \
+                  organisms.tickCount == self.tickCount
+
+    def perceiveAll(self, bots, origins=None):
+        selves = np.array([self.columnOf.get(bot, -1) for bot in bots],
+                                   dtype=int)
+        if origins is None:
+            origins = self.positions[selves]
+
+        if perceptionRadius( ) < inf:
+            perceptions = self.perceiveNear(origins, selves,
+                                                           perceptionRadius( ))
         else:
-            print('Unknown thing:', thing)
-
-def getSpots(me):
-    spots = [ ]
-    for organism in getOrganisms( ):
-        if organism != me:
-            s = Spot(me.position, organism)
-            spots.append(s)
-    return spots
-
-def getCloseIn(me):
-    isCloseIn = [ {'food': Fuzzy(0),
-                   'danger': Fuzzy(0),
-                   'friend' : Fuzzy(0)} for i in 'NSEW' ]
-
-    for spot in me.spots:
+            perceptions = self.perceiveEverything(origins, selves)
+
+        for bot, perception in zip(bots, perceptions):
+            self.perceptions[bot] = perception
+
+    def perceiveEverything(self, origins, selves):
+        perceptions = [ ]
+        block = max(1, PERCEPTION_BLOCK // max(1, len(self.members)))
+        for start in range(0, len(origins), block):
+            distances, bearings, closeIn = \
+                    perceive(origins[start:start + block], self.positions,
+                                self.kinds, selves[start:start + block])
+            for row in range(len(closeIn)):
+                perceptions.append((closeIn[row].tolist( ),
+                                             distances[row, self.dangers].tolist( ),
+                                             bearings[row, self.dangers].tolist( )))
+        return perceptions
+
+    def perceiveNear(self, origins, selves, radius):
+        if self.index == None or self.index.cellSize != radius:
+            self.index = CellIndex(self.positions,
+                                             np.arange(len(self.members)), radius)
+        queries, rows = self.index.within(origins, radius, selves)
+        order = np.lexsort((rows, queries))
+        queries = queries[order]
+        rows = rows[order]
+
+        vectors = self.positions[rows] - origins[queries]
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        bearings = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0]))
+        nearness = closeness(distances)
+        kinds = self.kinds[rows]
+
+        misses = np.ones((len(origins), 4, len(KINDS)))
+        directions = [bearings < 0,
+                           bearings > 0,
+                           np.abs(bearings) < 90,
+                           np.abs(bearings) > 90]
         for d in range(4):
-            if d in spot.direction:
-                isCloseIn[d][spot.kind] |= spot.isClose
-    return isCloseIn
+            seen = directions[d] & (kinds >= 0)
+            np.multiply.at(misses, (queries[seen], d, kinds[seen]),
+                                   1 - nearness[seen])
+        closeIn = 1 - misses
+
+        dangers = kinds == DANGER
+        splits = np.cumsum(np.bincount(queries[dangers],
+                                                      minlength=len(origins)))[:-1]
+        dangerDistances = np.split(distances[dangers], splits)
+        dangerBearings = np.split(bearings[dangers], splits)
+        return [(closeIn[row].tolist( ),
+                    dangerDistances[row].tolist( ),
+                    dangerBearings[row].tolist( )) \
+                   for row in range(len(origins))]
+
+    def perception(self, bot):
+        if bot not in self.perceptions:
+            self.perceiveAll([bot],
+                                   np.array([[bot.position.x, bot.position.y]]))
+        return self.perceptions[bot]
+
+snapshot = None
+
+def setPerceptionEpsilon(epsilon):
+    global perceptionEpsilon, snapshot
+    perceptionEpsilon = epsilon
+    snapshot = None
+
+def getSnapshot( ):
+    global snapshot
+    organisms = getOrganisms( )
+    if snapshot == None or not snapshot.isCurrent(organisms):
+        snapshot = Snapshot(organisms)
+    return snapshot
 
 class FuzzyLogicBot(Blue):
     def __init__(self, position):
         super().__init__(position)
         self.scared = Fuzzy(0)
 
+    def look(self):
+        closeIn, self.dangerDistances, self.dangerBearings = \
+                getSnapshot( ).perception(self)
+        self.isCloseIn = [{KINDS[kind]: Fuzzy(value) \
+                                  for kind, value in enumerate(values)} \
+                                 for values in closeIn]
+
     def calcLogic(self):
         self.isGoodIn = [ ]
         self.isBadIn = [ ]
@@ -102,19 +234,14 @@ class FuzzyLogicBot(Blue):
             self.isBadIn.append(isBad)
 
     def handleScared(self):
-        if self.isBadIn[N] |    \
-                self. isBadIn[S] |  \
-                self.isBadIn[E] |   \
-                self.isBadIn[W] > \
-                Fuzzy(0.5):
+        if Fuzzy.any(self.isBadIn) > Fuzzy(0.5):
 
             self.scared = Fuzzy(1)
         else:
             self.scared &= Fuzzy(0.9)
 
     def moveDirection(self):
-        self.spots = getSpots(self)
-        self.isCloseIn = getCloseIn(self)
+        self.look( )
         self.calcLogic( )
         self.handleScared( )
 
@@ -156,6 +283,9 @@ class FuzzyLogicBot(Blue):
 def closeTo(dist):
     return Fuzzy(1 / (max(1,dist)/20)**2)
 
+def closeness(distances):
+    return np.clip(1 / (np.maximum(1, distances) / 20)**2, 0, 1)
+
 if __name__ == '__main__':
     pygame.init()
 
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+from multiprocessing import Pool
+from Insects import *
+
+TRIALS = 4
+
+def runTrial(job):
+    seed, boardSize, genes, generation = job
+
+    openHeadless(boardSize)
+    setRandom(random.Random(seed))
+
+    chromosomes = [Chromosome.fromArray(gene) for gene in genes]
+    hives = OneRepeat(None, chromosomes, generation)
+    return [hive.score for hive in hives]
+
+def trialsMainLoop(boardSize, trials=TRIALS, generations=1000,
+                         seed=None, processes=None, checkpoint=None,
+                         resume=False):
+    if seed != None:
+        setRandom(random.Random(seed))
+
+    firstGeneration, state = resumeOrStart(checkpoint, {
+            'hives': [Chromosome( ).gene for i in range(9)]},
+            resume, generations - 1)
+    chromosomes = [Chromosome.fromArray(gene) \
+                            for gene in state['hives']]
+
+    with Pool(processes) as pool:
+        for generation in range(firstGeneration, generations):
+            start = time.perf_counter( )
+            genes = [list(chromosome.gene) for chromosome in chromosomes]
+            jobs = [(getRandom( ).getrandbits(31), boardSize,
+                        genes, generation) for trial in range(trials)]
+
+            results = pool.map(runTrial, jobs)
+            scores = [sum(result[i] for result in results) / trials \
+                           for i in range(len(chromosomes))]
+
+            print('\nGeneration', generation,
+                    'trials', trials,
+                    'in {0:.2f}s'.format(time.perf_counter( ) - start))
+            for i in range(len(chromosomes)):
+                print(chromosomes[i], 'Score:', scores[i])
+
+            order = sorted(range(len(chromosomes)),
+                                 key=lambda i: scores[i], reverse=True)
+            chromosomes = breedHives([chromosomes[i] for i in order])
+
+            if checkpoint != None:
+                saveCheckpoint(checkpoint, generation,
+                                       hives=[chromosome.gene \
+                                                 for chromosome in chromosomes])
+
+    return chromosomes
+
+if __name__ == '__main__':
+    trialsMainLoop(boardSize=(700,500),
+                        trials=os.cpu_count( ) or TRIALS,
+                        checkpoint='trials.npz' \
+                                if CHECKPOINT_FLAGS & set(sys.argv) else None,
+                        resume='--resume' in sys.argv)
@@ -1,9 +1,16 @@
 from operator import attrgetter
 from functools import reduce
+import os
+import sys
+import time
 from Flatworld import *
+from FlatworldCheckpoint import saveCheckpoint, resumeOrStart, \
+                                                  CHECKPOINT_FLAGS
 
 enableDraw = True
 
+SAMPLE_PATH = os.path.join('samples', 'insects-{0}-{1}.png')
+
 class Flower(Grass):
     def __init__(self, nest, position):
         super().__init__(position)
@@ -63,8 +70,8 @@ class Meadow(Nest):
         y = int(center.y)
         for i in range(100):
             position =  pygame.Vector2(
-                                    random.randint(x - 50, x + 50),
-                                    random.randint(y - 50, y + 50))
+                                    getRandom( ).randint(x - 50, x + 50),
+                                    getRandom( ).randint(y - 50, y + 50))
             if anyCollision(position) == None:
                 return position
         return None
@@ -86,7 +93,7 @@ class BeeHive(Nest):
         colors = ['gray20', 'sienna', 'lightcoral', 'tan',
                       'lightgoldenrod1', 'darkolivegreen2',
                       'deepskyblue', 'magenta3', 'gray80']
-        return pygame.Color(colors[self.index])
+        return pygame.Color(colors[self.index % len(colors)])
 
     def tick(self, secondsSinceLastFrame):
         self.draw(self.position)
@@ -103,7 +110,7 @@ class BeeHive(Nest):
         locations = list(map(attrgetter('foodLocation'),
                                     dancing))
 
-        return random.choice(locations) \
+        return getRandom( ).choice(locations) \
                                       if len(locations) > 0 else None
 
 class Insect(Organism):
@@ -157,7 +164,7 @@ class Insect(Organism):
         if organism != None:
             return organism
         else:   
-            self.position = newPosition
+            getOrganisms( ).relocate(self, newPosition)
             return None
 
     def tick(self, secondsSinceLastFrame):
@@ -183,10 +190,16 @@ class Chromosome:
         self.gene=[0]*5
         if chromosome == None:
             for i in range(5):
-                self.gene[i] = random.randint(10, 100)*1.0
+                self.gene[i] = getRandom( ).randint(10, 100)*1.0
         else:
             self.gene = list(chromosome.gene)
 
+    @staticmethod
+    def fromArray(array):
+        chromosome = Chromosome.__new__(Chromosome)
+        chromosome.gene = [float(gene) for gene in array]
+        return chromosome
+
     def exhaustionPeriod(self): return self.gene[0] * 7
     def restPeriod(self): return self.gene[1] * 2
     def fidgetChance(self): return self.gene[2]
@@ -194,15 +207,15 @@ class Chromosome:
     def concentrateHome(self): return self.gene[4]
 
     def mutate(self):
-        x = random.randint(0,4)
+        x = getRandom( ).randint(0,4)
         self.gene[x] = max(5.0, min(100.0,
-                self.gene[x] * random.randint(70, 130) / 100.0))
+                self.gene[x] * getRandom( ).randint(70, 130) / 100.0))
         return self
 
     def mate(self, other):
         child = Chromosome( )
         for i in range(len(self.gene)):
-            child.gene[i] = random.choice(
+            child.gene[i] = getRandom( ).choice(
                                            [self.gene[i], other.gene[i]])
         return child
 
@@ -279,38 +292,61 @@ class Bee(Insect):
 
             self.goingHome = True
 
-        if random.randint(0, 100) < \
+        if getRandom( ).randint(0, 100) < \
                              self.nest.chromosome.fidgetChance( ):
 
-           if self.goingHome and random.randint(0, 100) < \
+           if self.goingHome and getRandom( ).randint(0, 100) < \
                     self.nest.chromosome.concentrateHome( ):
 
                 return vectorTo(self.nestLocation, self.position)
 
            if self.targetLocation != None and \
-              random.randint(0, 100) < \
+              getRandom( ).randint(0, 100) < \
                       self.nest.chromosome.concentrateTarget( ):
                 return vectorTo(self.targetLocation,
                                       self.position)
 
            else:
-                x = random.randint(-1, 1)
-                y = random.randint(-1, 1)
+                x = getRandom( ).randint(-1, 1)
+                y = getRandom( ).randint(-1, 1)
                 self.direction = pygame.Vector2(x,y)
 
         return self.direction
 
+TEXT_CACHE_SIZE = 1024
+
+font = None
+textSurfaces = { }
+
+def renderText(text):
+    global font
+    if font == None:
+        font = pygame.font.SysFont('arial', 24)
+
+    if text not in textSurfaces:
+        if len(textSurfaces) >= TEXT_CACHE_SIZE:
+            textSurfaces.clear( )
+        textSurfaces[text] = font.render(text, True, pygame.Color(0,0,0))
+    return textSurfaces[text]
+
 def displayText(text, field, position):
-    font = pygame.font.SysFont('arial', 24)
-    surface = font.render(text, True, pygame.Color(0,0,0))
-    rect = surface.get_rect().move(10,10)
-    field.blit(surface, rect)
+    displayFields([text], field)
 
-def OneRepeat(clock, chromosomes, generation):
+def displayFields(texts, field):
+    x = 10
+    for text in texts:
+        surface = renderText(text)
+        field.blit(surface, surface.get_rect().move(x, 10))
+        x += surface.get_width( )
+
+def OneRepeat(clock, chromosomes, generation,
+                       sampleEvery=None, samplePath=SAMPLE_PATH):
     global organisms, nests, field, enableDraw
     field = getField()
-    organisms = [ ]
+    organisms = OrganismRegistry( )
     setOrganisms(organisms)
+    profiler = getProfiler( )
+    headless = isHeadless( )
     nests = [ ]
     frameDecimation = 300
 
@@ -325,56 +361,108 @@ def OneRepeat(clock, chromosomes, generation):
         organisms += spawn.getMembers()
         nests.append(spawn)
         i += 1
+    if headless and sampleEvery != None:
+        os.makedirs(os.path.dirname(samplePath) or '.', exist_ok=True)
+    profiler.lap('setup')
 
     for tickCounter in range(5000):
-        if tickCounter % frameDecimation == 0:
+        if headless:
+            enableDraw = sampleEvery != None and \
+                                tickCounter % sampleEvery == 0
+        elif tickCounter % frameDecimation == 0:
             enableDraw = True
 
         if enableDraw:
-            clock.tick(60)
+            if not headless:
+                clock.tick(60)
             field.fill('white')
-            displayText('Generation: ' + str(generation) +
-                            ' Frame: ' + str(tickCounter),
-                            getField( ), pygame.Vector2(0,0))
+            displayFields(['Generation: ', str(generation),
+                                 ' Frame: ', str(tickCounter)], getField( ))
 
         secondsSinceLastFrame  = 1/60.0
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return None
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return None
+        profiler.lap('events')
 
         for organism in organisms:
             organism.tick(secondsSinceLastFrame)
+        profiler.lap('organisms')
 
         for nest in nests:
             nest.tick(secondsSinceLastFrame)
+        profiler.lap('nests')
 
-        if enableDraw:
-            pygame.display.flip()
+        organisms.endTick( )
+        profiler.lap('bookkeeping')
 
-        keys = pygame.key.get_pressed()
-        if not keys[pygame.K_SPACE]:
-            enableDraw = False
+        if enableDraw:
+            if headless:
+                for organism in organisms:
+                    organism.draw(organism.position)
+                pygame.image.save(field,
+                                             samplePath.format(generation,
+                                                                        tickCounter))
+            else:
+                profiler.drawOverlay(field)
+                pygame.display.flip()
+            profiler.lap('display')
+
+        if not headless:
+            keys = pygame.key.get_pressed()
+            if not keys[pygame.K_SPACE]:
+                enableDraw = False
+        profiler.lap('events')
+        profiler.endTick( )
 
     return list(filter(lambda x: isinstance(x, BeeHive), nests))
 
-def insectMainLoop(boardSize):
+def breedHives(ranked):
+    return [ranked[0],
+                ranked[1],
+                ranked[2],
+                ranked[0].mate(ranked[1]).mutate( ),
+                ranked[0].mate(ranked[2]).mutate( ),
+                ranked[1].mate(ranked[2]).mutate( ),
+                ranked[0].mate(ranked[3]).mutate( ),
+                ranked[1].mate(ranked[4]).mutate( ),
+                ranked[2].mate(ranked[5]).mutate( )]
+
+def insectMainLoop(boardSize, seed=None, checkpoint=None, resume=False,
+                            headless=False, sampleEvery=None):
     global field
 
-    field = pygame.display.set_mode(boardSize)
-    setField(field)
+    if seed != None:
+        setRandom(random.Random(seed))
 
-    chromosomes = [Chromosome( ) for i in range(9)]
+    if headless:
+        field = openHeadless(boardSize, sampleEvery != None)
+    else:
+        field = pygame.display.set_mode(boardSize)
+        setField(field)
 
-    clock = pygame.time.Clock()
+    firstGeneration, state = resumeOrStart(checkpoint, {
+            'hives': [Chromosome( ).gene for i in range(9)]},
+            resume, 999)
+    chromosomes = [Chromosome.fromArray(gene) \
+                            for gene in state['hives']]
+
+    clock = None if headless else pygame.time.Clock()
     score = 0
 
-    for generation in range(1, 1000):
-        nests = OneRepeat(clock, chromosomes, generation)
+    for generation in range(firstGeneration, 1000):
+        start = time.perf_counter( )
+        nests = OneRepeat(clock, chromosomes, generation, sampleEvery)
         if nests == None:
             return
+        seconds = time.perf_counter( ) - start
 
         print('\nGeneration', generation)
+        if headless:
+            print('{0:.0f} frames per second'.format(
+                        getOrganisms( ).tickCount / seconds))
         for i in range(len(chromosomes)):
             print(chromosomes[i], 'Score:', nests[i].score)
 
@@ -382,25 +470,20 @@ def insectMainLoop(boardSize):
                              key=attrgetter('score'),
                              reverse=True)
 
-        chromosomes = [nests[0].chromosome,
-                nests[1].chromosome,
-                nests[2].chromosome,
-                nests[0].chromosome.mate( \
-                                  nests[1].chromosome).mutate( ),
-                nests[0].chromosome.mate( \
-                                  nests[2].chromosome).mutate( ),
-                nests[1].chromosome.mate( \
-                                  nests[2].chromosome).mutate( ),
-                nests[0].chromosome.mate( \
-                                  nests[3].chromosome).mutate( ),
-                nests[1].chromosome.mate( \
-                                  nests[4].chromosome).mutate( ),
-                nests[2].chromosome.mate( \
-                                  nests[5].chromosome).mutate( )]
+        chromosomes = breedHives([nest.chromosome for nest in nests])
+
+        if checkpoint != None:
+            saveCheckpoint(checkpoint, generation,
+                                   hives=[chromosome.gene \
+                                             for chromosome in chromosomes])
 
 if __name__ == '__main__':
     pygame.init()
 
-    insectMainLoop(boardSize=(700,500))
+    insectMainLoop(boardSize=(700,500),
+                         checkpoint='insects.npz' \
+                                 if CHECKPOINT_FLAGS & set(sys.argv) else None,
+                         resume='--resume' in sys.argv,
+                         headless='--headless' in sys.argv)
 
     pygame.quit()
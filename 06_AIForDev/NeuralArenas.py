@@ -0,0 +1,86 @@
+import os
+os.environ.setdefault('NEURAL_BACKEND', 'numpy')
+
+import sys
+import time
+from multiprocessing import Pool
+from NeuralFlatworld import *
+
+ARENAS = 4
+
+def evaluateArena(job):
+    seed, boardSize, redGenes, blueGenes, ticks, generation = job
+
+    openHeadless(boardSize)
+    setRandom(random.Random(seed))
+
+    reds = [Chromosome.fromArray(gene) for gene in redGenes]
+    blues = [Chromosome.fromArray(gene) for gene in blueGenes]
+    creatures, frameCount = oneGeneration(None, reds, blues,
+                                                          ticks, generation)
+
+    creatures = [creature for creature in creatures \
+                      if isinstance(creature, Creature)]
+    scores = np.array([creature.score for creature in creatures])
+    return scores[:len(reds)], scores[len(reds):], frameCount
+
+def arenasMainLoop(boardSize, population, generations,
+                           arenas=ARENAS, seed=None, processes=None,
+                           checkpoint=None, resume=False):
+    if seed != None:
+        setRandom(random.Random(seed))
+
+    numReds = int(population * CARNIVORE_FRACTION)
+    numBlues = int(population * (1 - CARNIVORE_FRACTION))
+    firstGeneration, state = resumeOrStart(checkpoint, {
+            'reds': packGenes([Chromosome( ) for i in range(numReds)]),
+            'blues': packGenes([Chromosome( ) for i in range(numBlues)])},
+            resume, generations)
+    redChromosomes = [Chromosome.fromArray(gene) \
+                               for gene in state['reds']]
+    blueChromosomes = [Chromosome.fromArray(gene) \
+                                for gene in state['blues']]
+    numReds = len(redChromosomes)
+    numBlues = len(blueChromosomes)
+
+    with Pool(processes) as pool:
+        for generation in range(firstGeneration, generations + 1):
+            start = time.perf_counter( )
+            redGenes = packGenes(redChromosomes)
+            blueGenes = packGenes(blueChromosomes)
+            jobs = [(getRandom( ).getrandbits(31), boardSize,
+                        redGenes, blueGenes,
+                        generationTicks(generation), generation) \
+                       for arena in range(arenas)]
+
+            results = pool.map(evaluateArena, jobs)
+            redScores = np.mean([result[0] for result in results], axis=0)
+            blueScores = np.mean([result[1] for result in results], axis=0)
+
+            reds = Population(redGenes).ranked(redScores)
+            blues = Population(blueGenes).ranked(blueScores)
+            redChromosomes = reds.breed(numReds, generatorFor( )).chromosomes( )
+            blueChromosomes = \
+                    blues.breed(numBlues, generatorFor( )).chromosomes( )
+            if checkpoint != None:
+                saveCheckpoint(checkpoint, generation,
+                                       reds=packGenes(redChromosomes),
+                                       blues=packGenes(blueChromosomes))
+
+            print('Generation', generation,
+                    'arenas', arenas,
+                    'frames', [result[2] for result in results],
+                    'red score {0:.2f}'.format(redScores.mean( )),
+                    'blue score {0:.2f}'.format(blueScores.mean( )),
+                    'in {0:.2f}s'.format(time.perf_counter( ) - start))
+
+    return redChromosomes, blueChromosomes
+
+if __name__ == '__main__':
+    arenasMainLoop(boardSize=(700,500),
+                           population=POPULATION,
+                           generations=GENERATIONS,
+                           arenas=os.cpu_count( ) or ARENAS,
+                           checkpoint='arenas.npz' \
+                                   if CHECKPOINT_FLAGS & set(sys.argv) else None,
+                           resume='--resume' in sys.argv)
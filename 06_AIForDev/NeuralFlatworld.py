@@ -1,12 +1,24 @@
+import os
+import sys
+import time
 from operator import attrgetter
 from functools import reduce
 
 from Flatworld import *
-from Insects import Insect, displayText
+from Insects import Insect, displayFields
+from FlatworldCheckpoint import saveCheckpoint, resumeOrStart, \
+                                                  CHECKPOINT_FLAGS
 
-import tensorflow as tf
 import numpy as np
 
+BACKENDS = ('tensorflow', 'numpy')
+BACKEND = os.environ.get('NEURAL_BACKEND', 'tensorflow')
+if BACKEND not in BACKENDS:
+    raise ValueError('NEURAL_BACKEND must be one of {0}, not {1!r}'.format(
+                                  ', '.join(BACKENDS), BACKEND))
+if BACKEND == 'tensorflow':
+    import tensorflow as tf
+
 NUM_DIRECTIONS = 2
 NUM_VARIANTS = 3
 NUM_EXTRAS = 6
@@ -21,69 +33,59 @@ CARNIVORE_FRACTION = 0.5
 
 GENERATIONS = 10000
 
-class Spot:
-    def __init__(self, creature, thing):
-        h = getHeight( )
-        w = getWidth( )
-        h2 = h / 2
-        w2 = w / 2
-        
-        self.zones = [0.0] * NUM_DIRECTIONS
-
-        vector = thing.position - creature.position
-
-        if vector.x > w2:
-            vector.x -= w
-
-        if vector.y > h2:
-            vector.y -= h
-
-        self.distance, self.bearing = vector.as_polar( )
-
-        _, sightAngle = creature.direction.as_polar( )
-        bearing = self.bearing - sightAngle
-
-        if bearing > -45 and bearing < 10:
-            self.zones[0] = 10.0 / self.distance \
-                                      if self.distance > 10 else 1.0
-
-        elif bearing < 45 and bearing > -10:
-            self.zones[1] = 10.0 / self.distance \
-                                      if self.distance > 10 else 1.0
-
-def getSpots(me):
-    organisms = getOrganisms()
-    redList = filter(lambda x: type(x) == Carnivore and \
-                                        x != me,
-                         organisms)
-
-    blueList = filter(lambda x: type(x) == Herbivore and \
-                                         x != me,
-                          organisms)
-
-    grassList = filter(lambda x: type(x) == Grass,
-                           organisms)
-
-    redSpots = list(map(lambda x: Spot(me, x),
-                                    redList))
-
-    blueSpots = list(map(lambda x: Spot(me, x),
-                                     blueList))
-
-    grassSpots = list(map(lambda x: Spot(me, x), grassList))
-
-    return redSpots, blueSpots, grassSpots
-
-def addTotals(a,b):
-    return map(lambda a,b: a + b, a, b)
-
-def getZones(spots):
-    if len(spots) == 0:
-        return [0.0] * NUM_DIRECTIONS
-    zonesList = map(attrgetter('zones'), spots)
-    zonesTotals = reduce(lambda a,b: addTotals(a,b),
-                                  zonesList)
-    return zonesTotals
+SAMPLE_PATH = os.path.join('samples', 'neural-{0}-{1}.png')
+
+PERCEPTION_BLOCK = 250000
+
+def perceptionFeatures(creatures):
+    h = getHeight( )
+    w = getWidth( )
+    h2 = h / 2
+    w2 = w / 2
+
+    origins = np.array([(creature.position.x, creature.position.y) \
+                                  for creature in creatures]).reshape(-1, 2)
+    sightAngles = np.degrees(np.arctan2(
+                            [creature.direction.y for creature in creatures],
+                            [creature.direction.x for creature in creatures]))
+    features = np.zeros((len(creatures), NUM_DIRECTIONS * NUM_VARIANTS))
+
+    members = list(getOrganisms( ))
+    for variant, sort in enumerate([Carnivore, Herbivore, Grass]):
+        targets = [organism for organism in members if type(organism) == sort]
+        if len(targets) == 0:
+            continue
+        positions = np.array([(organism.position.x, organism.position.y) \
+                                        for organism in targets])
+        columnOf = {targets[column]: column \
+                             for column in range(len(targets))}
+        selves = np.array([columnOf.get(creature, -1) \
+                                    for creature in creatures], dtype=int)
+
+        block = max(1, PERCEPTION_BLOCK // len(targets))
+        for start in range(0, len(creatures), block):
+            rows = slice(start, start + block)
+            vectors = positions[np.newaxis, :, :] - \
+                           origins[rows, np.newaxis, :]
+            x = vectors[..., 0]
+            y = vectors[..., 1]
+            x = np.where(x > w2, x - w, x)
+            y = np.where(y > h2, y - h, y)
+
+            distances = np.hypot(x, y)
+            bearings = np.degrees(np.arctan2(y, x)) - \
+                            sightAngles[rows, np.newaxis]
+            values = 10.0 / np.maximum(distances, 10)
+
+            own = np.flatnonzero(selves[rows] >= 0)
+            values[own, selves[rows][own]] = 0
+
+            left = (bearings > -45) & (bearings < 10)
+            right = ~left & (bearings < 45) & (bearings > -10)
+            features[rows, 2 * variant] = (values * left).sum(axis=1)
+            features[rows, 2 * variant + 1] = (values * right).sum(axis=1)
+
+    return features
 
 def caption(x):
     if x < NUM_OUTPUTS:
@@ -98,35 +100,33 @@ def caption(x):
 
     return s
 
+def constant(values):
+    if BACKEND == 'numpy':
+        return np.array(values, dtype=np.float32)
+    return tf.constant(values)
+
+def sigmoid(x):
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
 class Chromosome:
     def __init__(self, chromosome=None):
         if chromosome == None:
             matrix = [ ]
             for y in range(NUM_PERCEPTRONS):
-                matrix.append([random.random( )*2-1 for x in \
+                matrix.append([getRandom( ).random( )*2-1 for x in \
                                        range(NUM_PERCEPTRONS)])
-            self.gene=tf.constant(matrix)
+            self.gene = constant(matrix)
         else:
-            self.gene = tf.constant(chromosome.gene)
-
-    def mutate(self):
-        mine = np.array(self.gene)
-        for i in range(NUM_MUTATIONS):
-            x = random.randint(0,NUM_PERCEPTRONS - 1)
-            y = random.randint(0,NUM_PERCEPTRONS - 1)
-            mine[y][x] *= (random.random( ) * 1.5 + 0.5) * \
-                                  (random.randint(0, 1) * 2 - 1)
-        self.gene = tf.constant(mine)
-        return self
-
-    def mate(self, other):
-        child = Chromosome(self)
-        mask = tf.random.uniform(self.gene.shape, 
-                                               minval=0, maxval=2,
-                                               dtype=tf.int32)
-        mask = mask == 0
-        child.gene = tf.where(mask, self.gene, other.gene)
-        return child
+            self.gene = constant(chromosome.gene)
+
+    @staticmethod
+    def fromArray(array):
+        chromosome = Chromosome.__new__(Chromosome)
+        chromosome.gene = constant(array)
+        return chromosome
+
+    def toArray(self):
+        return np.array(self.gene, dtype=np.float32)
 
     def __str__(self):
         s = '<'
@@ -140,6 +140,9 @@ class Chromosome:
         return s
 
 def runNetwork(perceptrons, weights):
+    if BACKEND == 'numpy':
+        return sigmoid(weights @ np.asarray(perceptrons, dtype=np.float32))
+
     states0 = tf.constant(perceptrons)
    
     inputs = tf.math.reduce_sum(states0 * weights, axis=1)
@@ -147,22 +150,60 @@ def runNetwork(perceptrons, weights):
             
     return states1
 
+def runNetworks(perceptrons, weights):
+    if BACKEND == 'numpy':
+        states0 = np.asarray(perceptrons, dtype=np.float32)
+        return sigmoid(np.einsum('cij,cj->ci', weights, states0))
+
+    states0 = tf.constant(perceptrons, dtype=tf.float32)
+
+    inputs = tf.einsum('cij,cj->ci', weights, states0)
+    states1 = tf.math.sigmoid(inputs)
+
+    return np.array(states1)
+
+def stackGenes(creatures):
+    for row in range(len(creatures)):
+        creatures[row].row = row
+    genes = [creature.chromosome.gene for creature in creatures]
+    if BACKEND == 'numpy':
+        return np.stack(genes)
+    return tf.stack(genes)
+
+def perceptronsOf(creatures):
+    extras = np.array([creature.extraPerceptrons for creature in creatures],
+                               dtype=np.float32).reshape(-1, NUM_EXTRAS)
+    return np.hstack([np.zeros((len(creatures), NUM_OUTPUTS)),
+                               extras,
+                               perceptionFeatures(creatures)]).astype(np.float32)
+
+def thinkAll(creatures, genes):
+    if len(creatures) == 0:
+        return
+    perceptrons = perceptronsOf(creatures)
+    rows = [creature.row for creature in creatures]
+    if BACKEND == 'numpy':
+        weights = genes[rows]
+    else:
+        weights = tf.gather(genes, rows)
+    results = runNetworks(perceptrons, weights)
+    for creature, result in zip(creatures, results):
+        creature.respond(result)
+
 class Creature(Insect):
     def __init__(self, chromosome, position, color):
         super().__init__(None, position, 500, color)
         self.chromosome = chromosome
         self.score = 0
 
-        self.extraPerceptrons = [random.gauss(0, 1) for i in \
+        self.extraPerceptrons = [getRandom( ).gauss(0, 1) for i in \
                                                    range(NUM_EXTRAS)]
 
         self.direction = pygame.Vector2((-1, 0))
         self.direction = self.direction.rotate( \
-                                             45 * random.randint(0, 9))
+                                             45 * getRandom( ).randint(0, 9))
 
-        self.redZones = [ ]
-        self.blueZones = [ ]
-        self.grassZones = [ ]
+        self.planned = False
 
     def moveTo(self, newPosition):
         if newPosition.x < 0:
@@ -183,29 +224,24 @@ class Creature(Insect):
         if organism != None:
             return organism
         else:   
-            self.position = newPosition
+            getOrganisms( ).relocate(self, newPosition)
             return None
 
-    def moveDirection(self):
-        redSpots, blueSpots, grassSpots = getSpots(self)
-        self.redZones = list(getZones(redSpots))
-        self.blueZones = list(getZones(blueSpots))
-        self.grassZones = list(getZones(grassSpots))
-
-        self.perceptrons = tf.constant( \
-              [0.0 for i in range(NUM_OUTPUTS)] +
-              self.extraPerceptrons +
-              self.redZones + self.blueZones + self.grassZones)
-
-        result = runNetwork(self.perceptrons,
-                                     self.chromosome.gene)
-
+    def respond(self, result):
         outputs = np.array(result[:NUM_OUTPUTS])
         self.extraPerceptrons = \
                 list(np.array(result[NUM_OUTPUTS : \
                                   NUM_OUTPUTS + NUM_EXTRAS]))
 
         self.rotation = (outputs[0] - 0.5) * 180
+        self.planned = True
+
+    def moveDirection(self):
+        if not self.planned:
+            self.perceptrons = constant(perceptronsOf([self])[0])
+            self.respond(runNetwork(self.perceptrons,
+                                                self.chromosome.gene))
+        self.planned = False
             
         return self.direction.rotate(self.rotation)
 
@@ -233,40 +269,70 @@ class Herbivore(Creature):
             blocker.getBitten()
             self.score += 0.5
 
-def pickOne(highest):
-    x = abs(random.random( ) + random.random( ) - 1)
-    return int(x * highest)
+def pickMany(highest, count, generator):
+    x = np.abs(generator.random((2, count)).sum(axis=0) - 1)
+    return (x * highest).astype(int)
 
-def nextGeneration(creatures, population):
-    result = []
-    thru = len(creatures) // 3
-    for i in range(thru):
-        result.append(creatures[i].chromosome)
+class Population:
+    def __init__(self, genes):
+        self.genes = np.asarray(genes, dtype=np.float32)
+
+    @staticmethod
+    def fromChromosomes(chromosomes):
+        return Population(packGenes(chromosomes))
+
+    def chromosomes(self):
+        return [Chromosome.fromArray(gene) for gene in self.genes]
+
+    def ranked(self, scores):
+        order = np.argsort(-np.asarray(scores), kind='stable')
+        return Population(self.genes[order])
+
+    def breed(self, population, generator):
+        parents = len(self.genes)
+        thru = parents // 3
+        count = population - thru
 
-    for i in range(thru, population):
-        a = pickOne(len(creatures))
-        b = pickOne(len(creatures))
-        chromoA = creatures[a].chromosome
-        chromoB = creatures[b].chromosome
+        a = pickMany(parents, count, generator)
+        b = pickMany(parents, count, generator)
+        mask = generator.integers(0, 2, (count,) + self.genes.shape[1:]) == 0
+        children = np.where(mask, self.genes[a], self.genes[b])
 
-        result.append(chromoA.mate(chromoB).mutate( ))
+        mutations = count * NUM_MUTATIONS
+        rows = np.repeat(np.arange(count), NUM_MUTATIONS)
+        y = generator.integers(0, NUM_PERCEPTRONS, mutations)
+        x = generator.integers(0, NUM_PERCEPTRONS, mutations)
+        factors = (generator.random(mutations) * 1.5 + 0.5) * \
+                      (generator.integers(0, 2, mutations) * 2 - 1)
+        np.multiply.at(children, (rows, y, x), factors.astype(np.float32))
 
-    return result
+        return Population(np.concatenate([self.genes[:thru], children]))
+
+def generatorFor( ):
+    return np.random.default_rng(getRandom( ).getrandbits(64))
+
+def nextGeneration(creatures, population):
+    parents = Population.fromChromosomes([creature.chromosome \
+                                                             for creature in creatures])
+    return parents.breed(population, generatorFor( )).chromosomes( )
 
 def countCreatures(creatures, kind):
-    return len(list(
-                   filter(lambda a: type(a) == kind, creatures)))
+    return creatures.population(kind, exact=True)
 
 def oneGeneration(clock,
                            redChromosomes, blueChromosomes,
-                           ticks, generation):
+                           ticks, generation,
+                           sampleEvery=None, samplePath=SAMPLE_PATH):
 
     global organisms, field, enableDraw
 
     field = getField( )
-    organisms = [ ]
+    organisms = OrganismRegistry( )
     setOrganisms(organisms)
+    profiler = getProfiler( )
+    headless = isHeadless( )
     frameDecimation = 100
+    enableDraw = False
     redStartPopulation = len(redChromosomes)
     blueStartPopulation = len(blueChromosomes)
 
@@ -282,76 +348,134 @@ def oneGeneration(clock,
         organisms.append(Grass(randomDrop( )))
 
     allOrganisms = list(organisms)
+    creatures = [organism for organism in allOrganisms \
+                      if isinstance(organism, Creature)]
+    genes = stackGenes(creatures)
+    if headless and sampleEvery != None:
+        os.makedirs(os.path.dirname(samplePath) or '.', exist_ok=True)
+    profiler.lap('setup')
 
     for tickCounter in range(ticks):
-        if tickCounter % frameDecimation == 0:
+        if headless:
+            enableDraw = sampleEvery != None and \
+                                tickCounter % sampleEvery == 0
+        elif tickCounter % frameDecimation == 0:
             enableDraw = True
 
         redPop = countCreatures(organisms, Carnivore)
         bluePop = countCreatures(organisms, Herbivore)
         if bluePop < 1:
             break
+        profiler.lap('census')
 
         if enableDraw:
-            clock.tick(60)
+            if not headless:
+                clock.tick(60)
             field.fill('white')
         secondsSinceLastFrame  = 1/60.0
             
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return None, tickCounter
+        if not headless:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return None, tickCounter
+        profiler.lap('events')
+
+        thinkAll([creature for creature in creatures \
+                       if creature in organisms], genes)
+        profiler.lap('network')
 
         for organism in organisms:
             organism.tick(secondsSinceLastFrame)
 
-        if enableDraw:
-            displayText('Generation: ' + str(generation) +
-                            ' Frame: ' + str(tickCounter) +
-                            ' Pop: ' + str(redPop) +
-                            ', ' + str(bluePop),
-                            getField(), pygame.Vector2(0,0))
-            pygame.display.flip()
-
-        keys = pygame.key.get_pressed()
-        if not keys[pygame.K_SPACE]: enableDraw = False
+        organisms.endTick( )
+        profiler.lap('organisms')
 
-    print('population dropped to', redPop, bluePop)
-    return allOrganisms, tickCounter
-
-def neuralMainLoop(boardSize, population, generations):
+        if enableDraw:
+            if headless:
+                for organism in organisms:
+                    organism.draw(organism.position)
+            displayFields(['Generation: ', str(generation),
+                                 ' Frame: ', str(tickCounter),
+                                 ' Pop: ', str(redPop), ', ', str(bluePop)],
+                                getField( ))
+            if headless:
+                pygame.image.save(field,
+                                             samplePath.format(generation,
+                                                                        tickCounter))
+            else:
+                profiler.drawOverlay(field)
+                pygame.display.flip()
+            profiler.lap('display')
+
+        if not headless:
+            keys = pygame.key.get_pressed()
+            if not keys[pygame.K_SPACE]: enableDraw = False
+        profiler.lap('events')
+        profiler.endTick( )
+
+    return allOrganisms, organisms.tickCount
+
+def packGenes(chromosomes):
+    return np.stack([chromosome.toArray( ) for chromosome in chromosomes])
+
+def generationTicks(generation):
+    repeats = 200
+    if generation > 20: repeats = 300
+    if generation > 60: repeats = 500
+    if generation > 100: repeats = 800
+    if generation > 500: repeats = 500
+    if generation > 1000: repeats = 300
+    return repeats
+
+def neuralMainLoop(boardSize, population, generations, seed=None,
+                             checkpoint=None, resume=False, headless=False,
+                             sampleEvery=None):
     global field
     
-    field = pygame.display.set_mode(boardSize)
-    setField(field)
+    if seed != None:
+        setRandom(random.Random(seed))
+
+    if headless:
+        field = openHeadless(boardSize, sampleEvery != None)
+    else:
+        field = pygame.display.set_mode(boardSize)
+        setField(field)
     
     numReds = int(population * CARNIVORE_FRACTION)
     numBlues = int(population * (1 - CARNIVORE_FRACTION))
+    firstGeneration, state = resumeOrStart(checkpoint, {
+            'reds': packGenes([Chromosome( ) for i in range(numReds)]),
+            'blues': packGenes([Chromosome( ) for i in range(numBlues)])},
+            resume, generations)
+    redChromosomes = [Chromosome.fromArray(gene) \
+                                          for gene in state['reds']]
+    blueChromosomes = [Chromosome.fromArray(gene) \
+                                         for gene in state['blues']]
+    numReds = len(redChromosomes)
+    numBlues = len(blueChromosomes)
     print ('numReds:', numReds, 'numBlues:', numBlues)
-    
-    redChromosomes = [Chromosome( ) \
-                                              for i in range(numReds)]
-    blueChromosomes = [Chromosome( ) \
-                                             for i in range(numBlues)]
 
-    clock = pygame.time.Clock()
+    clock = None if headless else pygame.time.Clock()
     score = 0
 
-    for generation in range(1, generations + 1):
+    for generation in range(firstGeneration, generations + 1):
        print('\nGeneration', generation)
 
-       repeats = 200
-       if generation > 20: repeats = 300
-       if generation > 60: repeats = 500
-       if generation > 100: repeats = 800
-       if generation > 500: repeats = 500
-       if generation > 1000: repeats = 300
+       repeats = generationTicks(generation)
 
+       start = time.perf_counter( )
        creatures, frameCount = \
            oneGeneration(clock,
                              redChromosomes, blueChromosomes, 
-                             repeats, generation)
+                             repeats, generation, sampleEvery)
        if creatures == None:
            return score
+       seconds = time.perf_counter( ) - start
+       print('population dropped to',
+               countCreatures(getOrganisms( ), Carnivore),
+               countCreatures(getOrganisms( ), Herbivore))
+       if headless:
+           print('{0:.0f} frames per second'.format(frameCount / seconds))
        print('Duration:', frameCount, 'frames')
 
        reds = list(filter(
@@ -383,6 +507,11 @@ def neuralMainLoop(boardSize, population, generations):
            print('Blue chromosome:\n',str(blues[0].chromosome))
            print ('Blue score average:', blueScore)
 
+       if checkpoint != None:
+           saveCheckpoint(checkpoint, generation,
+                                  reds=packGenes(redChromosomes),
+                                  blues=packGenes(blueChromosomes))
+
 
 
 if __name__ == '__main__':
@@ -391,6 +520,10 @@ if __name__ == '__main__':
     
     neuralMainLoop(boardSize=(700,500), \
                            population=POPULATION, \
-                          generations=GENERATIONS)
+                          generations=GENERATIONS, \
+                          checkpoint='neural.npz' \
+                                  if CHECKPOINT_FLAGS & set(sys.argv) else None, \
+                          resume='--resume' in sys.argv, \
+                          headless='--headless' in sys.argv)
 
     pygame.quit()
\ No newline at end of file
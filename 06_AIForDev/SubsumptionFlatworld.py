@@ -1,3 +1,4 @@
+import numpy as np
 from Flatworld import *
 from FuzzyFlatworld import *
 
@@ -13,16 +14,22 @@ class SubsumptionBot(FuzzyLogicBot):
         self.fleeBehavior = \
             self.modules.newBehavior(FleeBehavior)
 
-    def tick(self, secondsSinceLastFrame):
-        self.spots = getSpots(self)
-        self.isCloseIn = getCloseIn(self)
+    def sense(self):
+        self.look( )
         self.calcLogic( )
         self.handleScared( )
 
-        self.modules.tick( )
+    def tick(self, secondsSinceLastFrame):
+        if tableArbitration:
+            self.winner = getArbitration( ).winnerFor(self)
+        else:
+            self.sense( )
+            self.modules.tick( )
         super().tick(secondsSinceLastFrame)
 
     def moveDirection(self):
+        if tableArbitration:
+            return self.winner.moveFunction( )
 
         direction = self.modules.moveDirection( )
 
@@ -54,6 +61,9 @@ class SubsumptionArchitecture(object):
             b.tickFunction( )
 
 class Behavior(object):
+    inhibits = [ ]
+    color = None
+
     def __init__(self,  bot):
         self.enabled = True
         self.bot = bot
@@ -81,14 +91,20 @@ class Behavior(object):
         pass
 
 class WanderBehavior(Behavior):
+    color = 'blue'
+
+    @staticmethod
+    def activeFor(bots):
+        return np.ones(len(bots), dtype=bool)
+
     def __init__(self,  bot):
         super().__init__(bot)
         self.lastDirection = pygame.Vector2(1,0)
 
     def moveFunction(self):
-        if random.randint(0, 100) < 10:
-            x = random.randint(-1, 1)
-            y = random.randint(-1, 1)
+        if getRandom( ).randint(0, 100) < 10:
+            x = getRandom( ).randint(-1, 1)
+            y = getRandom( ).randint(-1, 1)
             self.lastDirection = pygame.Vector2(x,y)
         return self.lastDirection
 
@@ -96,6 +112,16 @@ class WanderBehavior(Behavior):
         self.bot.color = 'blue'
 
 class FeedBehavior(Behavior):
+    inhibits = [WanderBehavior]
+    color = 'cyan'
+
+    @staticmethod
+    def activeFor(bots):
+        goods = np.array([[isGood.value for isGood in bot.isGoodIn] \
+                                    for bot in bots]).reshape(-1, 4)
+        speeds = np.array([bot.speed for bot in bots])
+        return (1 - np.prod(1 - goods, axis=1) > 0.001) & (speeds < 500)
+
     def moveFunction(self):
         move = pygame.Vector2( )
         if self.bot.isGoodIn[N] > self.bot.isGoodIn[S]:
@@ -110,9 +136,7 @@ class FeedBehavior(Behavior):
         return move
 
     def tickFunction(self):
-        goodInWorld = Fuzzy(0)
-        for isGood in self.bot.isGoodIn:
-            goodInWorld |= isGood
+        goodInWorld = Fuzzy.any(self.bot.isGoodIn)
 
         if goodInWorld > Fuzzy(0.001) and \
             self.bot.speed < 500:
@@ -120,73 +144,47 @@ class FeedBehavior(Behavior):
             self.bot.wanderBehavior.disable( )
             self.bot.color = 'cyan'
 
+FLEE_KERNEL = np.array([1, 0.75, 0.5, 0, 0, 0, 0.5, 0.75])
+FLEE_SPREAD = FLEE_KERNEL[(np.arange(8)[:, np.newaxis] -
+                                       np.arange(8)[np.newaxis, :]) % 8]
+FLEE_DIRECTIONS = [(-1,0), (-1,-1), (0,-1), (1, -1), \
+                              (1, 0), (1,1), (0,1), (-1,1)]
+
+def wallDangers(position, maxX, maxY):
+    x, y, right, bottom = closeness(np.array([position.x, position.y,
+                                                              maxX - position.x,
+                                                              maxY - position.y]))
+    sides = np.array([x, y, y, right, right, bottom, bottom, x])
+    corners = np.array([0, x, 0, y, 0, right, 0, bottom])
+    return (sides + corners - sides * corners) * 0.5
+
+def dangerSectors(bearings, distances):
+    bearings = np.array(bearings)
+    bearings = np.where(bearings > 157.5, bearings - 360, bearings)
+    sectors = np.clip(np.floor((bearings + 202.5) / 45), 0, 7).astype(int)
+    weights = FLEE_SPREAD[:, sectors] * closeness(np.array(distances))
+    return 1 - np.prod(1 - weights, axis=1)
+
 class FleeBehavior(Behavior):
+    inhibits = [WanderBehavior, FeedBehavior]
+    color = 'orange'
+
+    @staticmethod
+    def activeFor(bots):
+        return np.array([bot.scared.value for bot in bots]) > 0.2
+
     def moveFunction(self):
-        D = ['W', 'NW', 'N', 'NE', 'E', 'SE', 'S', 'SW']
+        walls = wallDangers(self.bot.position, getWidth( ), getHeight( ))
+        dangers = dangerSectors(self.bot.dangerBearings,
+                                              self.bot.dangerDistances)
+        isCloseIn = walls + dangers - walls * dangers
 
-        posX = self.bot.position.x
-        posY = self.bot.position.y
+        safest = int(np.argmin(isCloseIn))
+        if isCloseIn[safest] >= 1:
+            print('PANIC!')
+            return pygame.Vector2( )
 
-        maxX = getWidth( )
-        maxY =getHeight( )
-        
-        half = Fuzzy(0.5)
-
-        isCloseIn = [closeTo(posX),
-                    closeTo(posY) | closeTo(posX),
-                    closeTo(posY),
-                    closeTo(maxX - posX) | closeTo(posY),
-                    closeTo(maxX - posX),
-                    closeTo(maxX - posX) | closeTo(maxY - posY),
-                    closeTo(maxY - posY),
-                    closeTo(posX) | closeTo(maxY - posY)]
-                    
-        isCloseIn = list(map(lambda x: x & half, isCloseIn))
-
-        for i in range (8):
-
-            a = i * 45 - 180
-            low = a - 22.5
-            high = a + 22.5
-
-            before = (i + 7) % 8
-            beforeBefore = (i + 6) % 8
-            after = (i + 1) % 8
-            afterAfter = (i + 2) % 8
-
-            for spot in self.bot.spots:
-                if spot.kind == 'danger':
-
-                    bearing = spot.bearing
-
-                    if bearing < -180:
-                        bearing = bearing + 360
-
-                    if bearing > 157.5:
-                        bearing = bearing - 360
-
-                    if bearing >= low and bearing <= high:
-                        danger = closeTo(spot.distance)
-
-                        isCloseIn[i] |=  danger
-                        isCloseIn[before] |= danger & Fuzzy(0.75)
-                        isCloseIn[after] |= danger & Fuzzy(0.75)
-                        isCloseIn[beforeBefore] |= danger &  half
-                        isCloseIn[afterAfter] |= danger & half
-
-        safest = None
-        danger = Fuzzy(1)
-        for i in range(8):
-            if isCloseIn[i] < danger:
-                danger = isCloseIn[i]
-                safest = i
-        if safest == None:
-                print('PANIC!')
-                return pygame.Vector2( )
-
-        direction = [ (-1,0), (-1,-1), (0,-1), (1, -1), \
-                         (1, 0), (1,1), (0,1), (-1,1)]
-        return pygame.Vector2(direction[safest])
+        return pygame.Vector2(FLEE_DIRECTIONS[safest])
 
     def tickFunction(self):
         if self.bot.scared > Fuzzy(0.2):
@@ -194,6 +192,59 @@ class FleeBehavior(Behavior):
             self.bot.feedBehavior.disable( )
             self.bot.color = 'orange'
 
+BEHAVIORS = [WanderBehavior, FeedBehavior, FleeBehavior]
+INHIBITS = np.array([[inhibited in behavior.inhibits \
+                                for inhibited in BEHAVIORS] \
+                               for behavior in BEHAVIORS], dtype=int)
+
+def arbitrate(active):
+    inhibited = active.astype(int) @ INHIBITS > 0
+    winners = np.argmax(~inhibited, axis=1)
+    colors = len(BEHAVIORS) - 1 - np.argmax(active[:, ::-1], axis=1)
+    return winners, colors
+
+class ArbitrationTable:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.rowOf = { }
+        bots = [organism for organism in snapshot.members \
+                    if isinstance(organism, SubsumptionBot)]
+        for bot in bots:
+            self.rowOf[bot] = len(self.rowOf)
+            bot.sense( )
+        self.winners, self.colors = self.decide(bots)
+
+    def decide(self, bots):
+        active = np.stack([behavior.activeFor(bots) \
+                                    for behavior in BEHAVIORS], axis=1)
+        return arbitrate(active.reshape(-1, len(BEHAVIORS)))
+
+    def winnerFor(self, bot):
+        if bot in self.rowOf:
+            row = self.rowOf[bot]
+            winner, color = self.winners[row], self.colors[row]
+        else:
+            bot.sense( )
+            winners, colors = self.decide([bot])
+            winner, color = winners[0], colors[0]
+
+        bot.color = BEHAVIORS[color].color
+        return bot.modules.behaviors[winner]
+
+tableArbitration = True
+arbitration = None
+
+def setTableArbitration(enabled):
+    global tableArbitration, arbitration
+    tableArbitration = enabled
+    arbitration = None
+
+def getArbitration( ):
+    global arbitration
+    snapshot = getSnapshot( )
+    if arbitration == None or arbitration.snapshot is not snapshot:
+        arbitration = ArbitrationTable(snapshot)
+    return arbitration
 
 if __name__ == '__main__':
     